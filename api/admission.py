@@ -0,0 +1,286 @@
+import math
+import os
+import threading
+import time
+
+from flask import g, has_request_context, jsonify, request
+
+from capabilities import is_available
+from metrics import count, stage_timer
+from pdf_metadata import iter_image_xobjects, open_pdf_reader, page_size_points
+from rendering import THUMBNAIL_SIZE
+from request_params import expand_ranges
+
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+
+# Largest request body accepted, in megabytes; larger uploads get 413 before
+# they are read
+MAX_UPLOAD_MB = float(os.environ.get('MAX_UPLOAD_MB', '200'))
+
+# Most pages a single extraction request may process; larger documents need
+# a `pages` selection or POST /jobs
+MAX_REQUEST_PAGES = int(os.environ.get('MAX_REQUEST_PAGES', '500'))
+
+# Most megapixels a single extraction request may render or decode
+MAX_REQUEST_MEGAPIXELS = float(os.environ.get('MAX_REQUEST_MEGAPIXELS', '4000'))
+
+# Requests estimated above this many megapixels are heavy and need a slot
+HEAVY_REQUEST_MEGAPIXELS = float(os.environ.get('HEAVY_REQUEST_MEGAPIXELS', '200'))
+
+# Heavy extractions that may run at once
+HEAVY_REQUEST_SLOTS = int(os.environ.get('HEAVY_REQUEST_SLOTS', '2'))
+
+# Heavy requests that may wait for a slot, and how long each waits before
+# being turned away with 429
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', str(HEAVY_REQUEST_SLOTS * 2)))
+ADMISSION_WAIT_SECONDS = float(os.environ.get('ADMISSION_WAIT_SECONDS', '2'))
+
+# Retry-After sent with 429 until heavy request durations have been measured
+RETRY_AFTER_SECONDS = int(os.environ.get('RETRY_AFTER_SECONDS', '5'))
+
+class AdmissionError(Exception):
+    """
+    A request that cannot be processed now (429) or at all (413)
+    """
+
+    def __init__(self, message, status, retry_after=None, cost=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.cost = cost
+
+    def response(self):
+        """
+        JSON error response, with Retry-After for 429
+        """
+        body = {'success': False, 'error': str(self)}
+        if self.cost is not None:
+            body['cost'] = self.cost
+        headers = {'Retry-After': str(self.retry_after)} if self.retry_after else {}
+        return jsonify(body), self.status, headers
+
+def estimate_cost(source, method='render', dpi=200, pages=None, thumbnails=False):
+    """
+    Pages and megapixels an extraction would process, read from the PDF structure
+
+    Rendered pages cost their area at the render DPI (or a thumbnail);
+    embedded images cost their pixel dimensions. Only page and image
+    dictionaries are read, nothing is rendered or decoded. Returns None when
+    the PDF cannot be parsed, as the cost is then unknown.
+
+    Args:
+        source: PdfSource, bytes or file object
+        method (str): 'render', 'embedded' or 'auto'
+        dpi (int): Render resolution
+        pages (list): (first, last) page ranges, as returned by parse_ranges
+        thumbnails (bool): Whether pages are rendered as thumbnails
+    """
+    if not PYPDF2_AVAILABLE:
+        return None
+    try:
+        pdf_reader = open_pdf_reader(source)
+        page_numbers = expand_ranges(pages or [(1, None)], 1, len(pdf_reader.pages))
+        if len(page_numbers) > MAX_REQUEST_PAGES:
+            # Over budget whatever the pages hold; do not read them
+            return {'pages': len(page_numbers), 'megapixels': None}
+
+        pixels = 0
+        if method == 'embedded':
+            for _, _, _, xobj in iter_image_xobjects(pdf_reader, page_numbers):
+                pixels += int(xobj.get('/Width', 0)) * int(xobj.get('/Height', 0))
+        elif thumbnails:
+            pixels = len(page_numbers) * THUMBNAIL_SIZE * THUMBNAIL_SIZE
+        else:
+            for page_num in page_numbers:
+                width_pt, height_pt = page_size_points(pdf_reader.pages[page_num - 1])
+                pixels += width_pt * height_pt * dpi * dpi / (72 * 72)
+        return {'pages': len(page_numbers), 'megapixels': round(pixels / 1000000, 1)}
+    except Exception as e:
+        print(f"Error estimating extraction cost: {e}")
+        return None
+
+class AdmissionTicket:
+    """
+    An admitted request; heavy requests hold a slot until released
+    """
+
+    def __init__(self, controller, heavy):
+        self._controller = controller
+        self.heavy = heavy
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            if self.heavy:
+                self._controller._release(time.monotonic() - self._started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class AdmissionController:
+    """
+    Applies the per-request budgets and limits how many heavy extractions run at once
+
+    Light requests are admitted straight away, so they never queue behind a
+    large document. Heavy requests take one of ``slots`` slots; a bounded
+    number may wait a bounded time for one, after which they are turned away
+    with a Retry-After based on how long heavy requests have been taking.
+    That keeps the latency of every admitted request bounded instead of
+    letting work pile up.
+    """
+
+    def __init__(self, slots=None, queue_size=None, wait_seconds=None):
+        self.slots = max(1, slots or HEAVY_REQUEST_SLOTS)
+        self.queue_size = ADMISSION_QUEUE_SIZE if queue_size is None else queue_size
+        self.wait_seconds = ADMISSION_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self._semaphore = threading.BoundedSemaphore(self.slots)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Moving average of how long heavy requests hold their slot
+        self._hold_seconds = None
+
+    def check_budget(self, cost):
+        """
+        Raise AdmissionError (413) if a request is over the page or pixel budget
+        """
+        if cost is None:
+            return
+        if cost['pages'] > MAX_REQUEST_PAGES:
+            self._reject('pages')
+            raise AdmissionError(
+                f"Request covers {cost['pages']} pages, the limit is {MAX_REQUEST_PAGES}; "
+                f"select fewer pages or use POST /jobs", 413, cost=cost)
+        if cost['megapixels'] > MAX_REQUEST_MEGAPIXELS:
+            self._reject('pixels')
+            raise AdmissionError(
+                f"Request would process {cost['megapixels']} megapixels, the limit is "
+                f"{MAX_REQUEST_MEGAPIXELS:g}; select fewer pages or use POST /jobs",
+                413, cost=cost)
+
+    def admit(self, cost, blocking=False):
+        """
+        Check the budgets and, for heavy requests, take a slot
+
+        Requests whose cost is unknown count as heavy. Returns an
+        AdmissionTicket to release when the work is done; raises
+        AdmissionError when over budget (413) or over capacity (429).
+
+        Args:
+            cost (dict): Result of estimate_cost
+            blocking (bool): Wait for a slot however long it takes, for
+                callers whose concurrency is already bounded (batch workers)
+        """
+        self.check_budget(cost)
+        if cost is not None and cost['megapixels'] <= HEAVY_REQUEST_MEGAPIXELS:
+            return AdmissionTicket(self, heavy=False)
+
+        with self._lock:
+            if not blocking and self.waiting >= self.queue_size and self.running >= self.slots:
+                queue_full = True
+            else:
+                queue_full = False
+                self.waiting += 1
+        if queue_full:
+            self._reject('capacity')
+            raise AdmissionError('Server is busy with other large documents, retry later', 429,
+                                 retry_after=self.retry_after(), cost=cost)
+
+        try:
+            with stage_timer('admission_wait'):
+                acquired = self._semaphore.acquire(timeout=None if blocking else self.wait_seconds)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            self._reject('capacity')
+            raise AdmissionError('Server is busy with other large documents, retry later', 429,
+                                 retry_after=self.retry_after(), cost=cost)
+        with self._lock:
+            self.running += 1
+        return AdmissionTicket(self, heavy=True)
+
+    def retry_after(self):
+        """
+        Seconds a turned away request should wait before retrying
+        """
+        with self._lock:
+            if self._hold_seconds is None:
+                return RETRY_AFTER_SECONDS
+            return max(1, math.ceil(self._hold_seconds))
+
+    def _release(self, held_seconds):
+        with self._lock:
+            self.running -= 1
+            if self._hold_seconds is None:
+                self._hold_seconds = held_seconds
+            else:
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+        self._semaphore.release()
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected += 1
+        count('admission_rejected', reason=reason)
+
+    def stats(self):
+        """
+        Slot usage and rejections, reported by /health
+        """
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'running': self.running,
+                'waiting': self.waiting,
+                'rejected': self.rejected
+            }
+
+_controller = None
+
+def get_admission_controller():
+    """
+    Get the admission controller shared by every request in this process
+    """
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+def admit_request(source, method='render', dpi=200, pages=None, thumbnails=False):
+    """
+    Admit an extraction request, holding its slot until the request ends
+
+    For streamed responses the slot is held until the last chunk has been
+    sent. Raises AdmissionError; see AdmissionController.admit.
+    """
+    with stage_timer('admission_scan'):
+        cost = estimate_cost(source, method, dpi, pages, thumbnails)
+    ticket = get_admission_controller().admit(cost)
+    if has_request_context():
+        g.setdefault('admission_tickets', []).append(ticket)
+    return ticket
+
+def init_app(app):
+    """
+    Limit the upload size and release admission slots when requests end
+    """
+    app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+    @app.before_request
+    def reject_large_uploads():
+        # Checked up front so the body is never read; chunked uploads are
+        # still cut off by MAX_CONTENT_LENGTH while parsing
+        if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+            count('admission_rejected', reason='upload_size')
+            return jsonify({'success': False, 'error': f'Upload is larger than {MAX_UPLOAD_MB:g} MB'}), 413
+
+    @app.teardown_request
+    def release_admission(exc):
+        for ticket in g.pop('admission_tickets', []):
+            ticket.release()
@@ -0,0 +1,265 @@
+import os
+
+from capabilities import is_available, lazy_module
+from metrics import stage_timer
+
+# Imported on first use
+np = lazy_module('numpy')
+NUMPY_AVAILABLE = is_available('numpy')
+Image = lazy_module('PIL.Image')
+
+# Longest side, in pixels, of the downsampled copy statistics are computed on
+ANALYTICS_SAMPLE_SIZE = int(os.environ.get('ANALYTICS_SAMPLE_SIZE', '512'))
+
+# Number of dominant colours reported per image
+DOMINANT_COLORS = int(os.environ.get('DOMINANT_COLORS', '5'))
+
+# Largest channel spread (max - min of R, G, B) a pixel may have and still
+# count as gray; absorbs JPEG noise and scanner colour fringes
+GRAYSCALE_TOLERANCE = 12
+
+# Share of pixels that may be coloured in a grayscale image
+GRAYSCALE_MAX_COLOR_RATIO = 0.001
+
+# A pixel is ink when it is darker than white by more than this; measuring
+# against white rather than the image's own background keeps solid colour
+# and dark images from being reported as blank
+INK_THRESHOLD = 48
+
+# Pages with less ink coverage than this are reported as blank
+BLANK_INK_RATIO = float(os.environ.get('BLANK_INK_RATIO', '0.001'))
+
+# Images whose 17x16 luminance thumbnail varies less than this are flat and
+# not hashed
+FLAT_HASH_RANGE = 4
+
+# Images whose 256-bit difference hashes differ in at most this many bits are
+# candidate near duplicates; pages of short text hash closely, so candidates
+# are confirmed by comparing pixels
+DUPLICATE_HASH_DISTANCE = int(os.environ.get('DUPLICATE_HASH_DISTANCE', '32'))
+
+# Side, in pixels, of the grayscale samples candidates are compared on
+DUPLICATE_SAMPLE_SIZE = 128
+
+# Private analytics entry holding an image's duplicate sample until
+# DuplicateFinder.flag removes it; never serialized
+DUPLICATE_SAMPLE_FIELD = '_duplicate_sample'
+
+# Sample pixels whose luminance differs by more than this have changed
+DUPLICATE_PIXEL_THRESHOLD = 64
+
+# Candidates are near duplicates when at most this share of the inked sample
+# pixels changed
+DUPLICATE_CHANGED_RATIO = float(os.environ.get('DUPLICATE_CHANGED_RATIO', '0.1'))
+
+def downsample(img, size=None):
+    """
+    RGB copy of an image whose longest side is at most ``size`` pixels
+
+    JPEGs that have not been decoded yet are decoded at reduced scale with
+    draft(), which changes ``img`` itself; only pass images the caller is
+    done with. Other images are shrunk with reduce() and a box filter, which
+    averages pixels rather than skipping them.
+    """
+    size = size or ANALYTICS_SAMPLE_SIZE
+    if img.format == 'JPEG' and img.im is None:
+        img.draft('RGB', (size, size))
+    sample = img
+    if max(img.size) > size:
+        scale = size / max(img.size)
+        new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        sample = img.resize(new_size, Image.Resampling.BOX, reducing_gap=2.0)
+    return sample.convert('RGB')
+
+def effective_dpi(img):
+    """
+    Resolution recorded in an image's metadata (or set for rendered pages), or None
+    """
+    dpi = img.info.get('dpi')
+    if not dpi:
+        return None
+    try:
+        return round(float(dpi[0]))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def difference_hash(pixels):
+    """
+    256-bit difference hash of an RGB pixel array as a hex string, or None
+    for flat images, whose hash would match any other flat image
+
+    Each bit compares two horizontally adjacent cells of a 17x16 luminance
+    thumbnail, so the hash follows the layout of the image rather than its
+    overall brightness.
+
+    Args:
+        pixels (numpy.ndarray): (height, width, 3) uint8 array
+    """
+    gray = Image.fromarray(luminance(pixels).astype(np.uint8)).resize((17, 16), Image.Resampling.BOX)
+    values = np.asarray(gray, dtype=np.float32)
+    if values.max() - values.min() < FLAT_HASH_RANGE:
+        return None
+    bits = np.packbits((values[:, 1:] > values[:, :-1]).ravel())
+    return bits.tobytes().hex()
+
+def changed_ratio(sample, other):
+    """
+    Share of the inked pixels of two duplicate samples that changed by more
+    than DUPLICATE_PIXEL_THRESHOLD
+
+    Only pixels that are ink in either sample count, so a few changed words
+    on a mostly white page are not diluted by the paper around them.
+    """
+    sample = sample.astype(np.int16)
+    other = other.astype(np.int16)
+    inked = np.count_nonzero((sample < 255 - INK_THRESHOLD) | (other < 255 - INK_THRESHOLD))
+    if not inked:
+        return 0.0
+    changed = np.count_nonzero(np.abs(sample - other) > DUPLICATE_PIXEL_THRESHOLD)
+    return changed / inked
+
+def luminance(pixels):
+    """
+    Rec. 601 luma of an RGB pixel array
+    """
+    return pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def dominant_colors(pixels, count=None):
+    """
+    Most common colours of an RGB pixel array and the share of pixels each covers
+
+    Pixels are bucketed by the top 4 bits of each channel; each colour is the
+    mean of the pixels in its bucket.
+    """
+    count = count or DOMINANT_COLORS
+    flat = pixels.reshape(-1, 3)
+    quantized = (flat >> 4).astype(np.int32)
+    buckets = (quantized[:, 0] << 8) | (quantized[:, 1] << 4) | quantized[:, 2]
+    totals = np.bincount(buckets, minlength=4096)
+    top = np.argsort(totals)[::-1][:count]
+
+    colors = []
+    for bucket in top:
+        fraction = round(float(totals[bucket]) / len(flat), 4)
+        if not fraction:
+            break
+        mean = flat[buckets == bucket].mean(axis=0)
+        colors.append({
+            'color': '#{:02x}{:02x}{:02x}'.format(*(int(round(channel)) for channel in mean)),
+            'fraction': fraction
+        })
+    return colors
+
+def analyze_pixels(img, duplicate_sample=False):
+    """
+    Print-readiness statistics for an image, or None if NumPy is unavailable
+
+    Statistics are computed on a downsampled copy (see ``downsample``):
+
+    - effective_dpi: resolution from the image metadata, if any
+    - color_class: 'bilevel', 'grayscale' or 'color'
+    - color_ratio: share of pixels that are not gray
+    - ink_coverage: share of pixels darker than white by more than
+      INK_THRESHOLD
+    - blank: whether ink_coverage is below BLANK_INK_RATIO
+    - dominant_colors: the most common colours with their share of pixels
+    - dhash: 256-bit difference hash for near-duplicate detection; None for
+      blank and flat images
+
+    Args:
+        img (PIL.Image): Image to analyze; it may be reduced in place, see
+            ``downsample``
+        duplicate_sample (bool): Also keep a DUPLICATE_SAMPLE_SIZE square
+            grayscale copy of hashed images under DUPLICATE_SAMPLE_FIELD,
+            for a DuplicateFinder that flags the record before it is
+            serialized
+    """
+    if not NUMPY_AVAILABLE:
+        return None
+
+    with stage_timer('analytics'):
+        dpi = effective_dpi(img)
+        bilevel = img.mode == '1'
+        pixels = np.asarray(downsample(img))
+
+        spread = pixels.max(axis=2).astype(np.int16) - pixels.min(axis=2)
+        color_ratio = float(np.count_nonzero(spread > GRAYSCALE_TOLERANCE)) / spread.size
+        if bilevel:
+            color_class = 'bilevel'
+        elif color_ratio <= GRAYSCALE_MAX_COLOR_RATIO:
+            color_class = 'grayscale'
+        else:
+            color_class = 'color'
+
+        luma = luminance(pixels)
+        ink = luma < 255 - INK_THRESHOLD
+        ink_coverage = float(np.count_nonzero(ink)) / ink.size
+        blank = ink_coverage < BLANK_INK_RATIO
+
+        # Blank pages are reported as such rather than as duplicates of each other
+        dhash = None if blank else difference_hash(pixels)
+        stats = {
+            'effective_dpi': dpi,
+            'color_class': color_class,
+            'color_ratio': round(color_ratio, 4),
+            'ink_coverage': round(ink_coverage, 4),
+            'blank': blank,
+            'dominant_colors': dominant_colors(pixels),
+            'dhash': dhash
+        }
+        if duplicate_sample and dhash:
+            # Taken from the pixels already decoded here, so candidates are
+            # compared without decoding the encoded image again
+            size = (DUPLICATE_SAMPLE_SIZE, DUPLICATE_SAMPLE_SIZE)
+            gray = Image.fromarray(luma.astype(np.uint8)).resize(size, Image.Resampling.BOX)
+            stats[DUPLICATE_SAMPLE_FIELD] = np.asarray(gray)
+        return stats
+
+class DuplicateFinder:
+    """
+    Flags images that look like an image seen earlier in the same response
+
+    Each image's difference hash is compared with every earlier hash at once,
+    so a whole document is checked in one pass as its records are produced.
+    Hashes within max_distance are only candidates: an image is flagged once
+    its duplicate sample (see analyze_pixels) matches the candidate's sample
+    pixel for pixel (see changed_ratio). The samples of every hashed image
+    are kept, DUPLICATE_SAMPLE_SIZE squared bytes each.
+    """
+
+    def __init__(self, max_distance=None):
+        self.max_distance = DUPLICATE_HASH_DISTANCE if max_distance is None else max_distance
+        self._hashes = []
+        self._samples = []
+        self._filenames = []
+
+    def flag(self, image_info):
+        """
+        Set analytics['near_duplicate_of'] to the filename of the closest
+        confirmed earlier image (or None) and return the record
+
+        The record's duplicate sample is removed. Records without analytics
+        are returned unchanged; blank and flat images, and images analyzed
+        without a duplicate sample, are never flagged.
+        """
+        analytics = (image_info or {}).get('analytics')
+        if not analytics:
+            return image_info
+        sample = analytics.pop(DUPLICATE_SAMPLE_FIELD, None)
+        analytics['near_duplicate_of'] = None
+        if sample is None or not analytics.get('dhash'):
+            return image_info
+
+        with stage_timer('analytics'):
+            bits = np.unpackbits(np.frombuffer(bytes.fromhex(analytics['dhash']), dtype=np.uint8))
+            if self._hashes:
+                distances = np.count_nonzero(np.array(self._hashes) != bits, axis=1)
+                candidates = np.flatnonzero(distances <= self.max_distance)
+                for candidate in candidates[np.argsort(distances[candidates], kind='stable')]:
+                    if changed_ratio(sample, self._samples[candidate]) <= DUPLICATE_CHANGED_RATIO:
+                        analytics['near_duplicate_of'] = self._filenames[candidate]
+                        break
+        self._hashes.append(bits)
+        self._samples.append(sample)
+        self._filenames.append(image_info['filename'])
+        return image_info
@@ -0,0 +1,92 @@
+import json
+import os
+import zipfile
+
+from flask import Response, stream_with_context
+
+class _ChunkBuffer:
+    """
+    Write-only file object that collects what ZipFile writes until drained
+
+    It is not seekable, so ZipFile writes each entry with a trailing data
+    descriptor and never has to go back and patch headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+def unique_filename(filename, used_names):
+    """
+    Base name of ``filename``, numbered if already in ``used_names``, which it is added to
+    """
+    name = os.path.basename(filename) or 'image'
+    stem, extension = os.path.splitext(name)
+    counter = 1
+    while name in used_names:
+        counter += 1
+        name = f"{stem}_{counter}{extension}"
+    used_names.add(name)
+    return name
+
+def stream_zip_response(images, pdf_filename):
+    """
+    Stream extracted images as a ZIP archive with a JSON manifest
+
+    Each image record's encoded bytes ('data') are written to the archive as a
+    file and sent to the client before the next image is produced. The
+    remaining fields go into manifest.json, written last, with 'archive_name'
+    pointing at the file for each record. Entries are stored uncompressed
+    since the images are already compressed.
+
+    Args:
+        images: Iterator of image info dicts produced with encoding='raw'
+        pdf_filename (str): Name of the uploaded PDF, used for the download name
+    """
+    def generate():
+        buffer = _ChunkBuffer()
+        manifest = []
+        used_names = set()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            try:
+                for image_info in images:
+                    data = image_info.pop('data', None)
+                    if data is not None:
+                        image_info['archive_name'] = unique_filename(image_info['filename'], used_names)
+                        archive.writestr(image_info['archive_name'], data)
+                    manifest.append(image_info)
+                    yield from buffer.drain()
+                summary = {
+                    'success': True,
+                    'message': f'Successfully extracted {len(manifest)} images',
+                }
+            except Exception as e:
+                summary = {
+                    'success': False,
+                    'error': f'Error processing PDF: {str(e)}',
+                }
+
+            summary['images'] = manifest
+            summary['total_images'] = len(manifest)
+            archive.writestr('manifest.json', json.dumps(summary, indent=2))
+        yield from buffer.drain()
+
+    download_name = f"{os.path.splitext(os.path.basename(pdf_filename))[0] or 'images'}_images.zip"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{download_name}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
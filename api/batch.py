@@ -0,0 +1,237 @@
+import os
+import tarfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import Response, stream_with_context
+
+from streaming import STREAM_FORMATS, format_record
+
+# Threads that process the files of batch requests; shared by every batch
+# request in the process, so concurrent batches queue behind each other
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+# Most files accepted in one batch request, counting archive members
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', '1000'))
+
+# Largest single file (or uncompressed archive member) processed in a batch
+BATCH_MAX_FILE_MB = float(os.environ.get('BATCH_MAX_FILE_MB', '100'))
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+def file_kind(filename):
+    """
+    Classify a batch file by its extension: 'pdf', 'image', 'archive' or None
+    """
+    name = filename.lower()
+    if name.endswith('.pdf'):
+        return 'pdf'
+    if name.endswith(IMAGE_EXTENSIONS):
+        return 'image'
+    if name.endswith(ARCHIVE_EXTENSIONS):
+        return 'archive'
+    return None
+
+def _ignored_member(name):
+    # Directory entries and metadata added by archivers, e.g. __MACOSX/._a.pdf
+    base = os.path.basename(name.rstrip('/'))
+    return not base or base.startswith('.') or name.startswith('__MACOSX/')
+
+def _entry(filename, data=None, error=None):
+    return {'filename': filename, 'kind': file_kind(filename), 'data': data, 'error': error}
+
+def _iter_zip_members(archive_name, stream, max_bytes):
+    with zipfile.ZipFile(stream) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or _ignored_member(info.filename):
+                continue
+            name = f"{archive_name}/{info.filename}"
+            if info.file_size > max_bytes:
+                yield _entry(name, error='File is too large')
+            elif file_kind(info.filename) in ('pdf', 'image'):
+                yield _entry(name, archive.read(info))
+            else:
+                yield _entry(name)
+
+def _iter_tar_members(archive_name, stream, max_bytes):
+    # Stream mode reads members in order without seeking back
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for info in archive:
+            if not info.isfile() or _ignored_member(info.name):
+                continue
+            name = f"{archive_name}/{info.name}"
+            if info.size > max_bytes:
+                yield _entry(name, error='File is too large')
+            elif file_kind(info.name) in ('pdf', 'image'):
+                yield _entry(name, archive.extractfile(info).read())
+            else:
+                yield _entry(name)
+
+def iter_batch_files(uploads, max_files=None, max_bytes=None):
+    """
+    Expand a batch request's uploads into one entry per PDF or image
+
+    ZIP and tar archives are read member by member, so only the files being
+    processed are held in memory. Each entry is a dict with 'filename',
+    'kind', 'data' (the file's bytes) and 'error'; files that cannot be
+    processed get an 'error' instead of failing the whole batch.
+
+    Args:
+        uploads: Iterable of uploaded files (werkzeug FileStorage)
+        max_files (int): Files after this many are not processed
+        max_bytes (int): Largest file accepted
+    """
+    if max_files is None:
+        max_files = BATCH_MAX_FILES
+    if max_bytes is None:
+        max_bytes = int(BATCH_MAX_FILE_MB * 1024 * 1024)
+
+    def expand():
+        for upload in uploads:
+            filename = upload.filename or 'upload'
+            kind = file_kind(filename)
+            if kind in ('pdf', 'image'):
+                data = upload.read(max_bytes + 1)
+                if len(data) > max_bytes:
+                    yield _entry(filename, error='File is too large')
+                else:
+                    yield _entry(filename, data)
+            elif kind == 'archive':
+                iter_members = _iter_zip_members if filename.lower().endswith('.zip') else _iter_tar_members
+                try:
+                    yield from iter_members(filename, upload.stream, max_bytes)
+                except (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError) as e:
+                    yield _entry(filename, error=f'Invalid archive: {e}')
+            else:
+                yield _entry(filename)
+
+    for count, entry in enumerate(expand()):
+        if count >= max_files:
+            # Report the first file over the limit and stop reading uploads
+            yield _entry(entry['filename'], error=f'Batch is limited to {max_files} files')
+            return
+        if entry['kind'] not in ('pdf', 'image') and entry['error'] is None:
+            entry['error'] = 'Unsupported file type'
+        yield entry
+
+class BatchRunner:
+    """
+    Processes batch files on a shared thread pool, yielding results as they finish
+
+    At most ``2 * workers`` files of a batch are read and queued at once, so
+    memory stays bounded for large archives. Rendering inside each file still
+    uses the render engine's process pool.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or BATCH_WORKERS)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch')
+
+    def run(self, entries, process_fn):
+        """
+        Process every entry, yielding a 'file' record for each in completion order
+
+        Args:
+            entries: Iterator of entries from iter_batch_files
+            process_fn: Function taking an entry and returning a dict of
+                result fields, e.g. {'images': [...], 'total_images': n};
+                exceptions it raises only fail that file
+        """
+        pending = {}
+        try:
+            for index, entry in enumerate(entries):
+                if entry['error'] is not None:
+                    yield _file_record(index, entry, error=entry['error'])
+                    continue
+                pending[self._executor.submit(process_fn, entry)] = (index, entry)
+                if len(pending) >= self.workers * 2:
+                    yield from self._drain(pending)
+
+            while pending:
+                yield from self._drain(pending)
+        finally:
+            # The client went away or the batch failed; drop queued files
+            for future in pending:
+                future.cancel()
+
+    def _drain(self, pending):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, entry = pending.pop(future)
+            try:
+                yield _file_record(index, entry, **future.result())
+            except Exception as e:
+                print(f"Error processing batch file {entry['filename']}: {e}")
+                yield _file_record(index, entry, error=f'Error processing file: {str(e)}')
+
+def _file_record(index, entry, error=None, **fields):
+    record = {
+        'type': 'file',
+        'index': index,
+        'filename': entry['filename'],
+        'kind': entry['kind'],
+        'success': error is None
+    }
+    if error is not None:
+        record['error'] = error
+    record.update(fields)
+    return record
+
+_runner = None
+
+def get_batch_runner():
+    """
+    Get the batch runner shared by every request in this process
+    """
+    global _runner
+    if _runner is None:
+        _runner = BatchRunner()
+    return _runner
+
+def stream_batch_response(records, stream_format):
+    """
+    Stream batch file records followed by a 'summary' record
+
+    Args:
+        records: Iterator of 'file' records, e.g. from BatchRunner.run
+        stream_format (str): 'ndjson' or 'sse'
+    """
+    def generate():
+        total_files = 0
+        files_failed = 0
+        total_images = 0
+        try:
+            for record in records:
+                total_files += 1
+                if record['success']:
+                    total_images += record.get('total_images', 0)
+                else:
+                    files_failed += 1
+                yield format_record(record, stream_format)
+
+            yield format_record({
+                'type': 'summary',
+                'success': True,
+                'message': f'Processed {total_files} files',
+                'total_files': total_files,
+                'files_failed': files_failed,
+                'total_images': total_images
+            }, stream_format)
+        except Exception as e:
+            yield format_record({
+                'type': 'error',
+                'success': False,
+                'error': f'Error processing batch: {str(e)}',
+                'total_files': total_files
+            }, stream_format)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=STREAM_FORMATS[stream_format],
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
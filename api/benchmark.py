@@ -0,0 +1,330 @@
+"""
+Benchmark extraction throughput and memory on synthetic PDFs
+
+Generates PDFs locally (scanned pages with embedded JPEG or Flate images, and
+vector pages with drawing operators and text), runs each extraction path on
+them in a fresh subprocess and reports pages/sec, peak RSS, response bytes and
+a render / encode / base64 time breakdown, along with the API's cold start
+time. Results are written as JSON so runs
+can be compared across changes:
+
+    python benchmark.py --pages 1,10,50 --output after.json --compare before.json
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+PAGE_KINDS = ('scanned-jpeg', 'scanned-flate', 'vector')
+PATHS = ('render', 'auto', 'embedded', 'metadata')
+
+# Letter size in points
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+
+def _scan_image(width, height, seed):
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    img = Image.effect_noise((width, height), 24).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle((x, y, x + rng.randrange(20, 200), y + rng.randrange(4, 16)), fill=(20, 20, 20))
+    return img.filter(ImageFilter.SMOOTH)
+
+def _vector_content(seed):
+    rng = random.Random(seed)
+    ops = []
+    for _ in range(200):
+        ops.append(
+            f"{rng.random():.3f} {rng.random():.3f} {rng.random():.3f} rg "
+            f"{rng.randrange(PAGE_WIDTH)} {rng.randrange(PAGE_HEIGHT)} {rng.randrange(5, 80)} {rng.randrange(5, 80)} re f"
+        )
+    for line in range(40):
+        ops.append(f"BT /F1 10 Tf 50 {740 - line * 17} Td (Synthetic benchmark text line {line}) Tj ET")
+    return '\n'.join(ops).encode('latin-1')
+
+def generate_pdf(path, pages, kind, image_dpi=100):
+    """
+    Write a synthetic PDF with the given number of pages
+
+    Args:
+        path (str): Output file path
+        pages (int): Number of pages
+        kind (str): 'scanned-jpeg', 'scanned-flate' or 'vector'
+        image_dpi (int): Resolution of the full-page images on scanned pages
+    """
+    objects = []
+
+    def add(data):
+        objects.append(data)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(None)  # filled in once the page ids are known
+    page_ids = []
+    width = PAGE_WIDTH * image_dpi // 72
+    height = PAGE_HEIGHT * image_dpi // 72
+
+    for page_num in range(pages):
+        if kind == 'vector':
+            content = _vector_content(page_num)
+            resources = b"<< /Font << /F1 %d 0 R >> >>" % font_id
+        else:
+            img = _scan_image(width, height, page_num)
+            if kind == 'scanned-jpeg':
+                buffer = io.BytesIO()
+                img.save(buffer, format='JPEG', quality=80)
+                data, image_filter = buffer.getvalue(), b'/DCTDecode'
+            else:
+                data, image_filter = zlib.compress(img.tobytes()), b'/FlateDecode'
+            image_id = add(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+                b"/BitsPerComponent 8 /Filter %s /Length %d >>\nstream\n" % (width, height, image_filter, len(data))
+                + data + b"\nendstream"
+            )
+            content = b"q %d 0 0 %d 0 0 cm /Im0 Do Q" % (PAGE_WIDTH, PAGE_HEIGHT)
+            resources = b"<< /XObject << /Im0 %d 0 R >> >>" % image_id
+
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R /Resources %s >>"
+            % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, content_id, resources)
+        ))
+
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids)
+    )
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.5\n")
+        offsets = []
+        for number, data in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + data + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog_id, xref))
+
+def _stage_breakdown(pdf_path, path, pages):
+    """
+    Time render (or parse), encode and base64 separately for one path
+
+    The render path uses the backend the API would choose for the document.
+    """
+    from encoders import ImageEncoder
+
+    stages = {'render': 0.0, 'encode': 0.0, 'base64': 0.0}
+    encoder = ImageEncoder()
+
+    def encode(img):
+        start = time.perf_counter()
+        # Same encoder as get_image_info_from_pil (IMAGE_ENCODER and friends)
+        buffer, _ = encoder.encode(img)
+        stages['encode'] += time.perf_counter() - start
+        return buffer.getbuffer()
+
+    def to_base64(data):
+        start = time.perf_counter()
+        base64.b64encode(data)
+        stages['base64'] += time.perf_counter() - start
+
+    if path == 'render':
+        from extractors import POPPLER, choose_render_backend
+        from ingest import PdfSource
+        from rendering import iter_page_images
+        with open(pdf_path, 'rb') as f:
+            source = PdfSource(f.read())
+        backend = choose_render_backend(pages)
+        if backend is POPPLER:
+            images = (img for _, img in iter_page_images(source, dpi=200))
+        else:
+            document = backend.open(source)
+            images = (backend.render_image(document, page_num, 200, None) for page_num in range(1, pages + 1))
+        while True:
+            start = time.perf_counter()
+            img = next(images, None)
+            stages['render'] += time.perf_counter() - start
+            if img is None:
+                break
+            to_base64(encode(img))
+    elif path == 'embedded':
+        import PyPDF2
+        from embedded import decode_to_pil, get_passthrough_bytes
+        from pdf_metadata import iter_image_xobjects
+        with open(pdf_path, 'rb') as f:
+            start = time.perf_counter()
+            xobjects = list(iter_image_xobjects(PyPDF2.PdfReader(f)))
+            stages['render'] += time.perf_counter() - start
+            for _, _, _, xobj in xobjects:
+                start = time.perf_counter()
+                passthrough = get_passthrough_bytes(xobj)
+                img = None if passthrough else decode_to_pil(xobj)
+                stages['render'] += time.perf_counter() - start
+                to_base64(passthrough[2] if passthrough else encode(img))
+    return {stage: round(seconds, 4) for stage, seconds in stages.items()}
+
+def run_case(pdf_path, path, pages):
+    """
+    Run one extraction path on one PDF; meant to run in a fresh process
+    """
+    import server
+    from pdf_metadata import iter_pdf_metadata
+
+    start = time.perf_counter()
+    with open(pdf_path, 'rb') as f:
+        if path == 'metadata':
+            images = list(iter_pdf_metadata(f, dpi=200))
+        else:
+            images = list(server.iter_images_from_pdf(f, method=path))
+    elapsed = time.perf_counter() - start
+    response_bytes = len(json.dumps({
+        'success': True,
+        'images': images,
+        'total_images': len(images)
+    }))
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    result = {
+        'seconds': round(elapsed, 4),
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else None,
+        'images': len(images),
+        'response_bytes': response_bytes,
+        # ru_maxrss is reported in KiB on Linux
+        'peak_rss_mb': round(usage_self.ru_maxrss / 1024, 1),
+        'peak_child_rss_mb': round(usage_children.ru_maxrss / 1024, 1),
+    }
+    if path in ('render', 'auto'):
+        from extractors import choose_render_backend
+        result['render_backend'] = getattr(choose_render_backend(pages), 'name', None)
+    if path in ('render', 'embedded') and images:
+        result['stages'] = _stage_breakdown(pdf_path, path, pages)
+    return result
+
+def render_available():
+    from extractors import choose_render_backend
+    return choose_render_backend() is not None
+
+def measure_cold_start(runs=5):
+    """
+    Median wall time of importing the API in a fresh interpreter, as a
+    serverless cold start would, plus the startup time the app reports
+    """
+    times = []
+    report = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-c', 'import json, app, capabilities; print(json.dumps(capabilities.report()))'],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        times.append((time.perf_counter() - start) * 1000)
+        if proc.returncode == 0:
+            report = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'process_ms': round(sorted(times)[len(times) // 2], 1),
+        'startup_ms': report['startup_ms'] if report else None,
+        'backends_loaded': [name for name, backend in (report or {}).get('backends', {}).items() if backend['loaded']]
+    }
+
+def compare(results, baseline, threshold):
+    """
+    Print changes against a baseline run; returns the regressed case names
+    """
+    previous = {case['name']: case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in results['cases']:
+        before = previous.get(case['name'])
+        if not before or 'error' in case or 'error' in before:
+            continue
+        speed = (case['pages_per_sec'] or 0) / (before['pages_per_sec'] or 1) - 1
+        memory = case['peak_rss_mb'] / (before['peak_rss_mb'] or 1) - 1
+        flag = ''
+        if speed < -threshold or memory > threshold:
+            regressions.append(case['name'])
+            flag = '  <-- regression'
+        print(f"{case['name']:40s} pages/sec {speed:+.1%}  peak RSS {memory:+.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', default='1,10,50', help='Comma separated page counts')
+    parser.add_argument('--kinds', default=','.join(PAGE_KINDS), help='Comma separated page kinds')
+    parser.add_argument('--paths', default=','.join(PATHS), help='Comma separated extraction paths')
+    parser.add_argument('--image-dpi', type=int, default=100, help='Resolution of images on scanned pages')
+    parser.add_argument('--output', default='benchmark.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change reported as a regression')
+    parser.add_argument('--run-case', nargs=3, metavar=('PDF', 'PATH', 'PAGES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        pdf_path, path, pages = args.run_case
+        print(json.dumps(run_case(pdf_path, path, int(pages))))
+        return
+
+    paths = args.paths.split(',')
+    if 'render' in paths and not render_available():
+        print("No render backend installed, skipping the render path")
+        paths.remove('render')
+
+    results = {
+        'created_at': time.time(),
+        'python': sys.version.split()[0],
+        'render_workers': os.environ.get('RENDER_WORKERS'),
+        'image_encoder': os.environ.get('IMAGE_ENCODER'),
+        'cold_start': measure_cold_start(),
+        'cases': []
+    }
+    print(f"{'cold start':40s} {results['cold_start']['process_ms']} ms process, "
+          f"{results['cold_start']['startup_ms']} ms app startup")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for kind in args.kinds.split(','):
+            for pages in (int(count) for count in args.pages.split(',')):
+                pdf_path = os.path.join(temp_dir, f"{kind}_{pages}.pdf")
+                generate_pdf(pdf_path, pages, kind, args.image_dpi)
+                for path in paths:
+                    name = f"{kind}/{pages}p/{path}"
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--run-case', pdf_path, path, str(pages)],
+                        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                    )
+                    try:
+                        case = json.loads(proc.stdout.strip().splitlines()[-1])
+                    except (IndexError, ValueError):
+                        case = {'error': proc.stderr.strip()[-500:] or 'no output'}
+                    case.update(name=name, kind=kind, pages=pages, path=path,
+                                pdf_bytes=os.path.getsize(pdf_path))
+                    results['cases'].append(case)
+                    if 'error' in case:
+                        print(f"{name:40s} error: {case['error']}")
+                    else:
+                        print(f"{name:40s} {case['pages_per_sec']:>9} pages/sec  {case.get('render_backend') or '':8s}"
+                              f"{case['peak_rss_mb']:>7} MB RSS  {case['response_bytes']:>11} bytes  "
+                              f"{case.get('stages', '')}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
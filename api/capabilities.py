@@ -0,0 +1,124 @@
+import importlib
+import importlib.util
+import os
+import shutil
+import sys
+import time
+import types
+
+# Module-level timestamp of the first import of this module, which app.py
+# and app_safe.py import first; startup time is measured from here
+_PROCESS_STARTED = time.perf_counter()
+
+# Directory containing the poppler binaries (pdftoppm, pdfinfo); searched on
+# PATH when unset
+POPPLER_PATH = os.environ.get('POPPLER_PATH')
+
+# Heavy optional libraries, by the name reported in /health
+BACKENDS = {
+    'PIL': 'PIL.Image',
+    'PyPDF2': 'PyPDF2',
+    'pdf2image': 'pdf2image',
+    'numpy': 'numpy',
+}
+
+_available = {}
+_import_seconds = {}
+_poppler = {}
+_startup_seconds = None
+
+def is_available(name):
+    """
+    Whether a module can be imported, checked without importing it
+
+    Only the module's spec is looked up, so this is cheap enough to call at
+    import time. The answer is cached.
+    """
+    if name not in _available:
+        try:
+            _available[name] = importlib.util.find_spec(name.partition('.')[0]) is not None
+        except (ImportError, ValueError):
+            _available[name] = False
+    return _available[name]
+
+def load(name):
+    """
+    Import a module, recording how long the first import took
+    """
+    # Time a package separately from its submodules
+    parent = name.rpartition('.')[0]
+    if parent:
+        load(parent)
+    # A module another thread is still importing is already in sys.modules;
+    # import_module waits for it to finish rather than returning it half done
+    imported = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not imported:
+        _import_seconds.setdefault(name, time.perf_counter() - start)
+    return module
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access
+
+    ``np = LazyModule('numpy')`` costs nothing until ``np.asarray`` is used,
+    so libraries an endpoint never touches are never imported. After the
+    first access the module's attributes are copied onto the stand-in.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+
+    def __getattr__(self, attr):
+        module = load(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+def lazy_module(name):
+    """
+    LazyModule for ``name``
+    """
+    return LazyModule(name)
+
+def poppler_path(tool='pdftoppm'):
+    """
+    Absolute path of a poppler binary, or None if it is not installed
+
+    The lookup runs once per tool and process rather than on every render.
+    """
+    if tool not in _poppler:
+        if POPPLER_PATH:
+            _poppler[tool] = shutil.which(tool, path=POPPLER_PATH)
+        else:
+            _poppler[tool] = shutil.which(tool)
+    return _poppler[tool]
+
+def mark_ready():
+    """
+    Record the time from the first import of this module until the app was built
+    """
+    global _startup_seconds
+    if _startup_seconds is None:
+        _startup_seconds = time.perf_counter() - _PROCESS_STARTED
+
+def report():
+    """
+    Capabilities and startup timings, as reported by /health
+
+    A backend's import time is None until something has used it, or when it
+    was imported by another backend (pdf2image imports PIL, for example).
+    """
+    backends = {}
+    for name, module in BACKENDS.items():
+        seconds = _import_seconds.get(module)
+        backends[name] = {
+            'available': is_available(module),
+            'loaded': module in sys.modules,
+            'import_ms': round(seconds * 1000, 1) if seconds is not None else None
+        }
+    return {
+        'startup_ms': round(_startup_seconds * 1000, 1) if _startup_seconds is not None else None,
+        'backends': backends,
+        'poppler': poppler_path()
+    }
@@ -2,6 +2,8 @@ import sys
 import subprocess
 import importlib
 
+from capabilities import poppler_path
+
 def check_package(package_name, install_command=None):
     """Check if a Python package is available"""
     try:
@@ -18,9 +20,14 @@ def check_system_dependencies():
     """Check system dependencies"""
     print("🔍 Checking system dependencies...")
     
-    # Check poppler (for pdf2image)
+    # Check poppler (for pdf2image), found the same way the API finds it
+    pdftoppm = poppler_path()
+    if pdftoppm is None:
+        print("❌ Poppler is NOT installed")
+        print("   Download from: https://github.com/oschwartz10612/poppler-windows/releases/")
+        return
     try:
-        result = subprocess.run(['pdftoppm', '-v'], 
+        result = subprocess.run([pdftoppm, '-v'], 
                               capture_output=True, text=True, timeout=5)
         if result.returncode == 0 or 'version' in result.stderr.lower():
             print("✅ Poppler is installed")
@@ -54,6 +61,7 @@ def main():
         ('PyPDF2', 'pip install PyPDF2'),
         ('pdf2image', 'pip install pdf2image'),
         ('dotenv', 'pip install python-dotenv'),
+        ('numpy', 'pip install numpy'),
     ]
     
     all_installed = True
@@ -61,6 +69,11 @@ def main():
         if not check_package(package, install_cmd):
             all_installed = False
     
+    # Optional render backends, faster than poppler for short documents
+    print("\n📦 Checking optional render backends...")
+    check_package('pypdfium2', 'pip install pypdfium2')
+    check_package('pymupdf', 'pip install PyMuPDF')
+    
     print("\n🖥️  Checking system dependencies...")
     check_system_dependencies()
     
@@ -73,7 +86,7 @@ def main():
         print("The API will work with available dependencies.")
     
     print("\n📋 Quick setup commands:")
-    print("pip install flask flask-cors Pillow PyPDF2 pdf2image python-dotenv")
+    print("pip install flask flask-cors Pillow PyPDF2 pdf2image python-dotenv numpy")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,317 @@
+"""
+Extract images from every PDF in a directory tree, straight to disk
+
+Each PDF is processed in a worker process with the same extraction code as
+the API, and its images are written as files next to a manifest.json, with
+no base64, JSON responses or HTTP in between:
+
+    python cli.py archive/ extracted/ --method auto --workers 8
+
+archive/2019/report.pdf ends up in extracted/2019/report.pdf/. Finished files
+are recorded in a checkpoint file (extracted/checkpoint.jsonl by default),
+so an interrupted run picks up where it stopped when started again. Files
+that changed since, or were extracted with other options, are extracted
+again; files that failed are only retried with --retry-failed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from archive import unique_filename
+from encoders import ENCODERS, ImageEncoder
+from extractors import EXTRACTION_METHODS
+from ingest import PdfSource
+from pdf_metadata import iter_pdf_metadata
+from request_params import parse_ranges
+from server import DEFAULT_DPI, iter_images_from_pdf
+
+def iter_pdf_files(input_dir, exclude_dir=None):
+    """
+    Yield the path of every PDF under input_dir, relative to it, in sorted order
+
+    Args:
+        input_dir (str): Directory to walk
+        exclude_dir (str): Directory not to descend into, e.g. the output
+            directory when it is inside input_dir
+    """
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for root, dirnames, filenames in os.walk(input_dir):
+        dirnames[:] = sorted(
+            name for name in dirnames if os.path.abspath(os.path.join(root, name)) != exclude_dir
+        )
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.pdf'):
+                yield os.path.relpath(os.path.join(root, filename), input_dir)
+
+def output_dir_for(output_root, relative_path):
+    """
+    Directory the images of one PDF are written to, named after the PDF
+
+    Keeping the extension means it cannot be the directory of, or contain,
+    another PDF's output: a/report.pdf and a/report/x.pdf get a/report.pdf/
+    and a/report/x.pdf/.
+    """
+    return os.path.join(output_root, relative_path)
+
+def extract_file(pdf_path, output_dir, options):
+    """
+    Extract one PDF's images into output_dir; runs in a worker process
+
+    Images are written to a temporary sibling directory that replaces
+    output_dir once the manifest is written, so an interrupted file never
+    looks finished. Only this PDF's previous output is replaced. Returns a
+    dict with the number of images.
+
+    Args:
+        pdf_path (str): PDF to extract
+        output_dir (str): Directory for the images and manifest.json
+        options (dict): method, encoder, quality, pages, metadata_only and
+            analytics, as parsed by main
+    """
+    pages = parse_ranges(options['pages']) if options['pages'] else None
+    parent_dir = os.path.dirname(output_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+    # A fresh directory of its own holds the new output and, once swapped
+    # out, the previous one, so removing it touches nothing else
+    staging_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(output_dir)}.", suffix='.partial', dir=parent_dir)
+    try:
+        partial_dir = os.path.join(staging_dir, 'new')
+        os.mkdir(partial_dir)
+        manifest = _write_images(pdf_path, partial_dir, options, pages)
+        if os.path.isdir(output_dir):
+            os.replace(output_dir, os.path.join(staging_dir, 'old'))
+        os.replace(partial_dir, output_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return {'images': len(manifest)}
+
+def _write_images(pdf_path, partial_dir, options, pages):
+    manifest = []
+    used_names = set()
+    with open(pdf_path, 'rb') as pdf_file:
+        # File-backed sources are memory-mapped rather than read into memory
+        source = PdfSource.from_upload(pdf_file)
+        try:
+            if options['metadata_only']:
+                images = iter_pdf_metadata(source, dpi=DEFAULT_DPI, pages=pages)
+            else:
+                # The records the API's ZIP output is made of. Errors are
+                # raised rather than logged, so a damaged PDF fails
+                images = iter_images_from_pdf(source, options['method'], encoding='raw',
+                                              encoder=ImageEncoder(options['encoder'], options['quality']),
+                                              pages=pages, analytics=options['analytics'], strict=True)
+            # Every page gives a record unless only embedded images are extracted
+            every_page = options['metadata_only'] or options['method'] != 'embedded'
+            for image_info in images:
+                data = image_info.pop('data', None)
+                if data is not None:
+                    image_info['file'] = unique_filename(image_info['filename'], used_names)
+                    with open(os.path.join(partial_dir, image_info['file']), 'wb') as image_file:
+                        image_file.write(data)
+                manifest.append(image_info)
+        finally:
+            source.close()
+
+    # Nothing at all where every page gives a record means the PDF could not be read
+    if not manifest and every_page:
+        raise RuntimeError('No images extracted, the PDF may be damaged')
+
+    with open(os.path.join(partial_dir, 'manifest.json'), 'w') as manifest_file:
+        json.dump({
+            'source': os.path.basename(pdf_path),
+            'images': manifest,
+            'total_images': len(manifest)
+        }, manifest_file, indent=2)
+    return manifest
+
+def _timed_extract(pdf_path, output_dir, options):
+    start = time.perf_counter()
+    result = extract_file(pdf_path, output_dir, options)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+class Checkpoint:
+    """
+    Append-only JSON lines file recording every file a run has finished
+
+    Each line is flushed to disk as soon as a file is done, so at most the
+    files in flight are lost when a run is interrupted. The last record for
+    a path wins; a truncated last line is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                for line in checkpoint_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.records[record['file']] = record
+        self._file = open(path, 'a')
+
+    def is_done(self, relative_path, stat, options_key, retry_failed=False):
+        """
+        Whether a file was already handled with these options and has not changed since
+        """
+        record = self.records.get(relative_path)
+        if record is None or record.get('options') != options_key:
+            return False
+        if record.get('size') != stat.st_size or record.get('mtime') != stat.st_mtime:
+            return False
+        return record['status'] == 'done' or not retry_failed
+
+    def record(self, record):
+        self.records[record['file']] = record
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+def run(input_dir, output_root, options, workers=1, checkpoint_path=None, retry_failed=False):
+    """
+    Extract every PDF under input_dir that the checkpoint does not mark as done
+
+    With more than one worker, PDFs are processed in parallel in worker
+    processes, at most ``2 * workers`` at a time. Returns a summary dict.
+    """
+    os.makedirs(output_root, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(output_root, 'checkpoint.jsonl'))
+    options_key = json.dumps(options, sort_keys=True)
+
+    todo = []
+    skipped = 0
+    for relative_path in iter_pdf_files(input_dir, exclude_dir=output_root):
+        stat = os.stat(os.path.join(input_dir, relative_path))
+        if checkpoint.is_done(relative_path, stat, options_key, retry_failed):
+            skipped += 1
+        else:
+            todo.append((relative_path, stat))
+
+    summary = {'files': len(todo) + skipped, 'skipped': skipped, 'done': 0, 'failed': 0, 'images': 0}
+    print(f"{len(todo)} PDFs to extract, {skipped} already done")
+    started = time.perf_counter()
+
+    def finish(relative_path, stat, result=None, error=None):
+        record = {
+            'file': relative_path,
+            'status': 'failed' if error else 'done',
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'options': options_key,
+            'finished_at': time.time()
+        }
+        position = summary['done'] + summary['failed'] + 1
+        if error:
+            record['error'] = error
+            summary['failed'] += 1
+            print(f"[{position}/{len(todo)}] {relative_path}: failed: {error}")
+        else:
+            record.update(result)
+            summary['done'] += 1
+            summary['images'] += result['images']
+            print(f"[{position}/{len(todo)}] {relative_path}: {result['images']} images in {result['seconds']}s")
+        checkpoint.record(record)
+
+    def arguments(relative_path):
+        return (os.path.join(input_dir, relative_path), output_dir_for(output_root, relative_path), options)
+
+    executor = None
+    try:
+        if workers <= 1:
+            for relative_path, stat in todo:
+                try:
+                    finish(relative_path, stat, _timed_extract(*arguments(relative_path)))
+                except Exception as e:
+                    finish(relative_path, stat, error=str(e))
+        else:
+            # Spawned workers import the extraction modules afresh, so they
+            # see environment settings made after this module was imported
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            pending = {}
+            queue = iter(todo)
+            while True:
+                for relative_path, stat in queue:
+                    pending[executor.submit(_timed_extract, *arguments(relative_path))] = (relative_path, stat)
+                    if len(pending) >= workers * 2:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative_path, stat = pending.pop(future)
+                    try:
+                        finish(relative_path, stat, future.result())
+                    except Exception as e:
+                        finish(relative_path, stat, error=str(e))
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        checkpoint.close()
+
+    summary['seconds'] = round(time.perf_counter() - started, 1)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input_dir', help='Directory searched for PDFs, including subdirectories')
+    parser.add_argument('output_dir', help='Directory the images and manifests are written to')
+    parser.add_argument('--method', choices=EXTRACTION_METHODS, default='render', help='Extraction method, as for the API')
+    parser.add_argument('--encoder', choices=ENCODERS, help='Output encoder (default: IMAGE_ENCODER)')
+    parser.add_argument('--quality', type=int, help='PNG compression level or JPEG/WebP quality')
+    parser.add_argument('--pages', help='Pages to extract from each PDF, e.g. 1-3,7')
+    parser.add_argument('--metadata-only', action='store_true', help='Only write manifests with image sizes')
+    parser.add_argument('--analytics', action='store_true', help='Add pixel statistics to the manifests')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='PDFs processed in parallel')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: OUTPUT_DIR/checkpoint.jsonl)')
+    parser.add_argument('--retry-failed', action='store_true', help='Extract files that failed in earlier runs again')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"{args.input_dir} is not a directory")
+    if args.pages:
+        try:
+            parse_ranges(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.analytics and args.metadata_only:
+        parser.error("--analytics cannot be combined with --metadata-only")
+
+    if args.workers > 1:
+        # Files are already processed in parallel; keep each worker's
+        # renders in its own process instead of starting a pool per worker.
+        # Read by the worker processes when they start.
+        os.environ.setdefault('RENDER_WORKERS', '1')
+
+    options = {
+        'method': args.method,
+        'encoder': args.encoder,
+        'quality': args.quality,
+        'pages': args.pages,
+        'metadata_only': args.metadata_only,
+        'analytics': args.analytics
+    }
+    try:
+        summary = run(args.input_dir, args.output_dir, options, workers=args.workers,
+                      checkpoint_path=args.checkpoint, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume")
+        sys.exit(130)
+
+    print(f"Extracted {summary['images']} images from {summary['done']} PDFs in {summary['seconds']}s "
+          f"({summary['skipped']} skipped, {summary['failed']} failed)")
+    if summary['failed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import io
+
+import pytest
+from PIL import Image
+
+class PdfBuilder:
+    """
+    Writes small PDFs object by object, for tests that need a specific page structure
+
+    Object numbers are handed out in the order objects are added; build()
+    adds the page tree and catalog and computes the cross-reference table.
+    """
+
+    def __init__(self):
+        self.objects = []
+        self.pages = []
+        self._font = None
+
+    def add(self, body):
+        self.objects.append(body if isinstance(body, bytes) else body.encode('latin-1'))
+        return len(self.objects)
+
+    def stream(self, entries, data):
+        return self.add(f"<< {entries} /Length {len(data)} >>\nstream\n".encode('latin-1') + data + b"\nendstream")
+
+    def jpeg(self, width=64, height=64, color=(200, 40, 40)):
+        """
+        Image XObject holding a DCTDecode (JPEG) image
+        """
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), color).save(buffer, 'JPEG')
+        return self.stream(f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                           "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode", buffer.getvalue())
+
+    def form(self, content, xobjects=None, fonts=False, bbox=(0, 0, 612, 792)):
+        """
+        Form XObject drawing ``content`` with its own resources
+        """
+        resources = self._resources(xobjects, fonts)
+        return self.stream(f"/Type /XObject /Subtype /Form /BBox [{' '.join(map(str, bbox))}] "
+                           f"/Resources {resources}", content)
+
+    def page(self, content, xobjects=None, fonts=False, size=(612, 792)):
+        """
+        Add a page drawing ``content``; xobjects maps resource names to object numbers
+        """
+        contents = self.stream('', content)
+        self.pages.append((contents, self._resources(xobjects, fonts), size))
+
+    def _resources(self, xobjects, fonts):
+        entries = []
+        if xobjects:
+            names = ' '.join(f"/{name} {number} 0 R" for name, number in xobjects.items())
+            entries.append(f"/XObject << {names} >>")
+        if fonts:
+            if self._font is None:
+                self._font = self.add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+            entries.append(f"/Font << /F1 {self._font} 0 R >>")
+        return f"<< {' '.join(entries)} >>"
+
+    def build(self):
+        objects = list(self.objects)
+        pages_number = len(objects) + len(self.pages) + 1
+        kids = []
+        for contents, resources, (width, height) in self.pages:
+            objects.append(f"<< /Type /Page /Parent {pages_number} 0 R /MediaBox [0 0 {width} {height}] "
+                           f"/Resources {resources} /Contents {contents} 0 R >>".encode('latin-1'))
+            kids.append(f"{len(objects)} 0 R")
+        objects.append(f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode('latin-1'))
+        objects.append(f"<< /Type /Catalog /Pages {pages_number} 0 R >>".encode('latin-1'))
+
+        output = io.BytesIO()
+        output.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(output.tell())
+            output.write(f"{number} 0 obj\n".encode('latin-1') + body + b"\nendobj\n")
+        xref = output.tell()
+        output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1'))
+        for offset in offsets:
+            output.write(f"{offset:010d} 00000 n \n".encode('latin-1'))
+        output.write(f"trailer\n<< /Size {len(objects) + 1} /Root {len(objects)} 0 R >>\n"
+                     f"startxref\n{xref}\n%%EOF\n".encode('latin-1'))
+        return output.getvalue()
+
+@pytest.fixture
+def pdf_builder():
+    return PdfBuilder()
+
+@pytest.fixture
+def text_pdf(pdf_builder):
+    """
+    Three pages of text, as bytes
+    """
+    for page_num in range(1, 4):
+        pdf_builder.page(f"BT /F1 24 Tf 72 700 Td (Page {page_num}) Tj ET".encode('latin-1'), fonts=True)
+    return pdf_builder.build()
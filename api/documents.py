@@ -0,0 +1,164 @@
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from capabilities import is_available, lazy_module
+from ingest import PdfSource
+from pdf_metadata import page_size_points
+from rendering import choose_dpi, get_page_count
+
+# Imported on first use
+PyPDF2 = lazy_module('PyPDF2')
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+
+# Memory kept for uploaded PDFs whose pages can still be requested one at a
+# time, e.g. after a thumbnail preview
+DOCUMENT_STORE_MAX_MB = float(os.environ.get('DOCUMENT_STORE_MAX_MB', '256'))
+
+# Number of parsed documents (xref and page index) kept for page requests
+DOCUMENT_INDEX_ENTRIES = int(os.environ.get('DOCUMENT_INDEX_ENTRIES', '16'))
+
+class DocumentIndex:
+    """
+    A stored PDF parsed once for random page access
+
+    The cross-reference table is read when the index is built and page sizes
+    are looked up from the page tree, so a later request for one page only
+    parses the objects that page uses. Use ``lock`` around ``reader`` since
+    PdfReader is not safe to share between threads.
+    """
+
+    def __init__(self, document_id, data):
+        self.document_id = document_id
+        self.source = PdfSource(data)
+        self.lock = threading.Lock()
+        self.reader = None
+        self.page_sizes = []
+        if PYPDF2_AVAILABLE:
+            try:
+                self.reader = PyPDF2.PdfReader(self.source.open())
+                self.page_sizes = [page_size_points(page) for page in self.reader.pages]
+            except Exception as e:
+                print(f"Error indexing document {document_id}: {e}")
+                self.reader = None
+                self.page_sizes = []
+        self.page_count = len(self.page_sizes) if self.reader else get_page_count(self.source)
+
+    def page_dpi(self, page_num, max_dpi):
+        """
+        DPI for a full-resolution render of one page, or None if there is no such page
+
+        Pages are rendered at ``max_dpi`` unless that would exceed the pixel
+        budget (see ``choose_dpi``). Without PyPDF2 page sizes are unknown
+        and every page uses ``max_dpi``.
+        """
+        if not 1 <= page_num <= self.page_count:
+            return None
+        if self.page_sizes:
+            return choose_dpi(*self.page_sizes[page_num - 1], max_dpi)
+        return max_dpi
+
+class DocumentStore:
+    """
+    LRU store of recently uploaded PDFs, keyed by the SHA-256 of their bytes
+
+    Lets a client browse page thumbnails and fetch full-resolution pages later
+    without uploading the PDF again. Documents are kept per process, so a
+    request routed to another instance may have to upload the PDF again.
+    """
+
+    def __init__(self, max_bytes, index_entries=DOCUMENT_INDEX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.index_entries = index_entries
+        self._documents = OrderedDict()
+        self._indexes = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, pdf_data):
+        """
+        Keep a copy of a PDF and return its document id, or None if the PDF
+        is larger than the whole store and cannot be kept
+
+        Args:
+            pdf_data: Bytes-like PDF data, e.g. ``PdfSource.data``
+        """
+        document_id = hashlib.sha256(pdf_data).hexdigest()
+        with self._lock:
+            if document_id in self._documents:
+                self._documents.move_to_end(document_id)
+                return document_id
+            if len(pdf_data) > self.max_bytes:
+                return None
+
+            data = bytes(pdf_data)
+            self._documents[document_id] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                evicted_id, evicted = self._documents.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._indexes.pop(evicted_id, None)
+        return document_id
+
+    def get_index(self, document_id):
+        """
+        DocumentIndex for a stored document, parsing it on first use; None if unknown
+        """
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is not None:
+                self._indexes.move_to_end(document_id)
+                return index
+            data = self._documents.get(document_id)
+            if data is None:
+                return None
+            self._documents.move_to_end(document_id)
+
+        # Parse outside the lock; two racing requests just build it twice
+        index = DocumentIndex(document_id, data)
+        with self._lock:
+            self._indexes[document_id] = index
+            while len(self._indexes) > self.index_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+_store = None
+
+def get_document_store():
+    """
+    Get the document store shared by every request in this process
+    """
+    global _store
+    if _store is None:
+        _store = DocumentStore(int(DOCUMENT_STORE_MAX_MB * 1024 * 1024))
+    return _store
+
+def thumbnail_fields(document_id, page_sizes, page_num, max_dpi):
+    """
+    Fields added to a page thumbnail record describing its full-resolution render
+
+    Args:
+        document_id (str): Id under which the PDF is kept in the document
+            store, or None if it could not be kept
+        page_sizes (list): (width, height) in points per page, may be empty
+        page_num (int): 1-based page number
+        max_dpi (int): Resolution full pages are rendered at when within budget
+    """
+    fields = {
+        'tier': 'thumbnail',
+        'document_id': document_id,
+        'full_dpi': None,
+        'full_width': None,
+        'full_height': None
+    }
+    if page_num and page_num <= len(page_sizes):
+        width_pt, height_pt = page_sizes[page_num - 1]
+        dpi = choose_dpi(width_pt, height_pt, max_dpi)
+        fields.update(
+            full_dpi=dpi,
+            full_width=math.ceil(round(width_pt * dpi / 72, 6)),
+            full_height=math.ceil(round(height_pt * dpi / 72, 6))
+        )
+    return fields
@@ -0,0 +1,289 @@
+import base64
+import hashlib
+import io
+
+from capabilities import is_available, lazy_module
+from metrics import stage_timer
+from pdf_metadata import (PASSTHROUGH_FILTERS, aspect_ratio, color_space_to_mode, embedded_image_filename,
+                          iter_image_xobjects, open_pdf_reader, stored_format, stream_filters)
+from placement import get_page_placements, placement_fields
+from request_params import expand_ranges, select_indices
+
+# Imported on first use
+Image = lazy_module('PIL.Image')
+PIL_AVAILABLE = is_available('PIL')
+pdf_filters = lazy_module('PyPDF2.filters')
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+
+def _decode_parms(xobj, index):
+    parms = xobj.get('/DecodeParms')
+    if parms is None:
+        return None
+    parms = parms.get_object()
+    if isinstance(parms, list):
+        return parms[index].get_object() if index < len(parms) else None
+    return parms
+
+def _apply_filter(data, image_filter, parms):
+    if image_filter in ('/FlateDecode', '/Fl'):
+        return pdf_filters.FlateDecode.decode(data, parms)
+    if image_filter in ('/LZWDecode', '/LZW'):
+        return pdf_filters.LZWDecode.decode(data, parms)
+    if image_filter in ('/ASCII85Decode', '/A85'):
+        return pdf_filters.ASCII85Decode.decode(data)
+    if image_filter in ('/ASCIIHexDecode', '/AHx'):
+        return pdf_filters.ASCIIHexDecode.decode(data)
+    raise NotImplementedError(f"unsupported filter {image_filter}")
+
+def get_passthrough_bytes(xobj):
+    """
+    Return (format, extension, bytes) for images stored as a complete file
+
+    JPEG, JPEG 2000 and JBIG2 streams are returned exactly as embedded in the
+    PDF. Any transport filters in front of the image filter (e.g. FlateDecode
+    wrapping a JPEG) are undone first. Returns None for other images.
+    """
+    filters = stream_filters(xobj)
+    if not filters or filters[-1] not in PASSTHROUGH_FILTERS:
+        return None
+
+    data = xobj._data
+    for index, image_filter in enumerate(filters[:-1]):
+        data = _apply_filter(data, image_filter, _decode_parms(xobj, index))
+
+    format_type, extension = PASSTHROUGH_FILTERS[filters[-1]]
+    return format_type, extension, data
+
+def decode_to_pil(xobj, data=None):
+    """
+    Decode a raw (e.g. FlateDecode) image XObject into a PIL Image
+
+    Args:
+        xobj: Image XObject stream
+        data (bytes): Already decoded stream data, decoded here if omitted
+    """
+    size = (int(xobj['/Width']), int(xobj['/Height']))
+    bits = int(xobj['/BitsPerComponent']) if '/BitsPerComponent' in xobj else 8
+    if data is None:
+        data = xobj.get_data()
+
+    if xobj.get('/ImageMask'):
+        return Image.frombytes('1', size, data)
+
+    color_space = xobj.get('/ColorSpace')
+    color_space = color_space.get_object() if color_space is not None else None
+    if isinstance(color_space, list) and color_space and color_space[0] == '/Indexed':
+        base, hival, lookup = (value.get_object() for value in color_space[1:4])
+        img = Image.frombytes('P', size, data)
+        lookup = lookup.get_data() if hasattr(lookup, 'get_data') else bytes(lookup)
+        if color_space_to_mode(base) == 'L':
+            lookup = b''.join(lookup[i:i + 1] * 3 for i in range(len(lookup)))
+        img.putpalette(lookup)
+        return img
+
+    mode = color_space_to_mode(color_space, bits)
+    if mode not in ('1', 'L', 'RGB', 'CMYK'):
+        mode = 'RGB'
+    return Image.frombytes(mode, size, data)
+
+def build_passthrough_info(xobj, filename, format_type, data, encoding='base64'):
+    """
+    Image info dict for an image whose original bytes are returned unchanged
+    """
+    width, height = int(xobj['/Width']), int(xobj['/Height'])
+    bits = int(xobj['/BitsPerComponent']) if '/BitsPerComponent' in xobj else 8
+    image_info = {
+        'filename': filename,
+        'width': width,
+        'height': height,
+        'format': format_type,
+        'mode': '1' if xobj.get('/ImageMask') else color_space_to_mode(xobj.get('/ColorSpace'), bits),
+        'file_size': len(data),
+        'aspect_ratio': aspect_ratio(width, height)
+    }
+    if encoding == 'raw':
+        image_info['data'] = data
+    else:
+        with stage_timer('base64'):
+            image_info['base64'] = base64.b64encode(data).decode('utf-8')
+    return image_info
+
+def build_raw_info(xobj, filename, data, encoding='base64'):
+    """
+    Image info dict for an image returned as its stored stream, undecoded
+
+    'filters' lists the filters still applied to the data, e.g.
+    ['FlateDecode'], and the record's 'width', 'height' and 'mode' describe
+    the samples they decode to.
+    """
+    image_info = build_passthrough_info(xobj, filename, 'Raw', data, encoding)
+    image_info['filters'] = [image_filter.lstrip('/') for image_filter in stream_filters(xobj)]
+    return image_info
+
+def _content_hash(xobj, data):
+    # Dimensions and colour space are part of the identity of decoded samples
+    digest = hashlib.sha1(data)
+    digest.update(repr((xobj.get('/Width'), xobj.get('/Height'), xobj.get('/ColorSpace'))).encode('utf-8'))
+    return digest.hexdigest()
+
+def build_reference_info(original, filename, page_num):
+    """
+    Image info dict for a repeated occurrence of an already extracted image
+
+    The image data is not repeated; ``duplicate_of`` names the original record
+    and ``pages`` is the original's list of the pages the image appears on,
+    shared so it keeps growing as later pages are read.
+    """
+    return {
+        'filename': filename,
+        'width': original['width'],
+        'height': original['height'],
+        'format': original['format'],
+        'mode': original['mode'],
+        'file_size': original['file_size'],
+        'aspect_ratio': original['aspect_ratio'],
+        'base64': None,
+        'page': page_num,
+        'duplicate_of': original['filename'],
+        'pages': original['pages']
+    }
+
+def iter_embedded_images(pdf_file, info_fn, convert=True, encoding='base64', pages=None, analyze_fn=None):
+    """
+    Extract embedded images from a PDF without rendering its pages
+
+    JPEG, JPEG 2000 and JBIG2 images are returned as their original bytes.
+    Other images (FlateDecode and friends) are only decoded when ``convert``
+    is true, in which case they are handed to ``info_fn`` to be encoded as
+    PNG; otherwise their stream is returned as stored (see build_raw_info).
+
+    Images shared between pages (the same indirect object, or identical image
+    data) are processed once. Later occurrences are yielded as lightweight
+    reference records, and every record for the image carries the same list
+    of pages it appears on. The list is only complete once extraction ends:
+    a record serialized as soon as it is yielded lists the pages seen so
+    far (stream_images_response sends the final lists in its summary).
+
+    Every record also says how the image is drawn on its page: 'placements'
+    (placed size in points and DPI per axis) and 'effective_dpi', found by
+    scanning the page's content stream (see placement_fields).
+
+    Args:
+        pdf_file: PdfSource, bytes, file object or an already parsed PdfReader
+        info_fn: Function taking (image, filename) and returning an image info
+            dict, e.g. ``get_image_info_from_pil``
+        convert (bool): Whether to decode and re-encode non-passthrough images
+        encoding (str): 'base64' to embed image bytes as base64 strings, or
+            'raw' to return them under 'data'
+        pages (list): (first, last) page ranges to extract from, as returned
+            by parse_ranges; every page when omitted
+        analyze_fn: Function taking a PIL image and returning its pixel
+            statistics, e.g. ``analyze_pixels``; passthrough images are only
+            decoded for it when given
+    """
+    pdf_reader = open_pdf_reader(pdf_file)
+    page_numbers = expand_ranges(pages, 1, len(pdf_reader.pages)) if pages is not None else None
+    seen_refs = {}
+    seen_hashes = {}
+    placements_page, placements = None, {}
+
+    for page_num, name, reference, xobj in iter_image_xobjects(pdf_reader, page_numbers):
+        ref_key = (reference.idnum, reference.generation) if reference is not None else None
+        try:
+            # Placements are found once per page, the first time it has an image
+            if page_num != placements_page:
+                placements_page = page_num
+                placements = get_page_placements(pdf_reader.pages[page_num - 1])
+            placement = placement_fields(placements.get(name), int(xobj['/Width']), int(xobj['/Height']))
+
+            original = seen_refs.get(ref_key)
+            if original is None:
+                with stage_timer('embedded_decode'):
+                    passthrough = get_passthrough_bytes(xobj)
+                    if passthrough:
+                        format_type, extension, data = passthrough
+                    elif convert:
+                        extension, data = stored_format(xobj)[1], xobj.get_data()
+                    else:
+                        extension, data = 'bin', xobj._data
+
+                content_key = _content_hash(xobj, data)
+                original = seen_hashes.get(content_key)
+
+            if original is not None:
+                if page_num not in original['pages']:
+                    original['pages'].append(page_num)
+                filename = embedded_image_filename(page_num, name)
+                if ref_key is not None:
+                    seen_refs.setdefault(ref_key, original)
+                reference_info = build_reference_info(original, filename, page_num)
+                reference_info.update(placement)
+                yield reference_info
+                continue
+
+            if passthrough or not convert:
+                filename = embedded_image_filename(page_num, name, extension)
+                if passthrough:
+                    image_info = build_passthrough_info(xobj, filename, format_type, data, encoding)
+                else:
+                    image_info = build_raw_info(xobj, filename, data, encoding)
+                if analyze_fn is not None and PIL_AVAILABLE:
+                    try:
+                        img = Image.open(io.BytesIO(data)) if passthrough else decode_to_pil(xobj)
+                        image_info['analytics'] = analyze_fn(img)
+                    except Exception as e:
+                        # JBIG2 and some JPEG 2000 images cannot be decoded by PIL
+                        print(f"Error analyzing {filename}: {e}")
+                        image_info['analytics'] = None
+            else:
+                with stage_timer('embedded_decode'):
+                    img = decode_to_pil(xobj, data)
+                filename = embedded_image_filename(page_num, name, extension)
+                image_info = info_fn(img, filename)
+
+            if image_info:
+                image_info['page'] = page_num
+                image_info['pages'] = [page_num]
+                image_info.update(placement)
+                if image_info.get('analytics') and placement['effective_dpi'] is not None:
+                    # The DPI the image is printed at, not the one stored in its file
+                    image_info['analytics']['effective_dpi'] = placement['effective_dpi']
+                if ref_key is not None:
+                    seen_refs[ref_key] = image_info
+                seen_hashes[content_key] = image_info
+                yield image_info
+        except Exception as e:
+            print(f"Error extracting embedded image: {e}")
+            continue
+
+def select_images(images, ranges):
+    """
+    Yield the image records at the 0-based positions covered by parsed ranges
+
+    Like select_indices, except that a selected reference record whose
+    original was passed over is replaced by the original, so every image in
+    the selection comes with its data. Later references to it stay
+    references.
+    """
+    consumed = []
+    passed_over = {}
+
+    def track():
+        try:
+            for image_info in images:
+                consumed.append(image_info)
+                yield image_info
+        finally:
+            close = getattr(images, 'close', None)
+            if close is not None:
+                close()
+
+    for image_info in select_indices(track(), ranges):
+        # Everything consumed before this record was not selected; only
+        # originals of embedded images (the records with 'pages') are kept
+        for skipped in consumed[:-1]:
+            if 'pages' in skipped and 'duplicate_of' not in skipped:
+                passed_over[skipped['filename']] = skipped
+        consumed.clear()
+        original = passed_over.pop(image_info.get('duplicate_of'), None)
+        yield original if original is not None else image_info
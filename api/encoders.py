@@ -0,0 +1,141 @@
+import io
+import os
+
+from request_params import get_param
+
+# Encoder for rendered pages and decoded images: png, jpeg, webp or original.
+# Lossless PNG at compress_level 1 encodes a 200 DPI scanned page about 3.7x
+# faster than PIL's default level 6 for ~6% larger output (see benchmark.py)
+IMAGE_ENCODER = os.environ.get('IMAGE_ENCODER', 'png')
+
+# zlib compression level for PNG output (0-9)
+PNG_COMPRESS_LEVEL = int(os.environ.get('PNG_COMPRESS_LEVEL', '1'))
+
+# Quality for JPEG and WebP output (1-100)
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', '85'))
+
+ENCODERS = ('png', 'jpeg', 'webp', 'original')
+
+ENCODER_FORMATS = {'png': 'PNG', 'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+# Formats an image may keep with the 'original' encoder
+ORIGINAL_FORMATS = ('PNG', 'JPEG', 'GIF', 'BMP', 'TIFF', 'WEBP')
+
+# Modes each output format can store; other modes are converted first
+FORMAT_MODES = {
+    'PNG': ('1', 'L', 'LA', 'I', 'I;16', 'P', 'RGB', 'RGBA'),
+    'JPEG': ('L', 'RGB', 'CMYK'),
+    'WEBP': ('RGB', 'RGBA'),
+}
+
+FORMAT_EXTENSIONS = {
+    'PNG': ('png',),
+    'JPEG': ('jpg', 'jpeg'),
+    'WEBP': ('webp',),
+    'GIF': ('gif',),
+    'BMP': ('bmp',),
+    'TIFF': ('tif', 'tiff'),
+}
+
+def convert_for_format(img, format_type):
+    """
+    Convert an image to a mode the output format can store
+
+    Transparency is kept where the format supports it; images are only
+    converted when their mode cannot be written as is.
+    """
+    modes = FORMAT_MODES.get(format_type)
+    if modes is None or img.mode in modes:
+        return img
+
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or 'transparency' in img.info
+    grayscale = img.mode in ('1', 'L', 'LA', 'La', 'I', 'I;16', 'F')
+    if format_type == 'JPEG':
+        return img.convert('L' if grayscale else 'RGB')
+    if format_type == 'PNG' and grayscale:
+        return img.convert('LA' if has_alpha else 'L')
+    return img.convert('RGBA' if has_alpha else 'RGB')
+
+def output_filename(filename, format_type):
+    """
+    Give a filename the extension of the format it was encoded as
+    """
+    extensions = FORMAT_EXTENSIONS.get(format_type)
+    root, ext = os.path.splitext(filename)
+    if not extensions or not ext or ext[1:].lower() in extensions:
+        return filename
+    return f"{root}.{extensions[0]}"
+
+class ImageEncoder:
+    """
+    Encodes PIL images for API responses
+
+    Args:
+        name (str): 'png', 'jpeg', 'webp', or 'original' to keep an image's own
+            format (and its original bytes when given), falling back to PNG
+        level (int): compress_level (0-9) for PNG, quality (1-100) for JPEG
+            and WebP; the configured default when omitted
+    """
+
+    def __init__(self, name=None, level=None):
+        self.name = (name or IMAGE_ENCODER).lower()
+        if self.name not in ENCODERS:
+            raise ValueError(f"Unsupported encoder: {self.name}")
+        if level is not None:
+            low, high = (0, 9) if self.name in ('png', 'original') else (1, 100)
+            if not low <= level <= high:
+                raise ValueError(f"Encoder level for {self.name} must be between {low} and {high}")
+        self.level = level
+
+    @property
+    def cache_label(self):
+        """
+        Identifies the encoder settings in result cache keys
+        """
+        return f"{self.name}:{self.level if self.level is not None else 'default'}"
+
+    def encode(self, img, original=None):
+        """
+        Encode an image, returning (buffer, format_type)
+
+        The BytesIO buffer holds the encoded bytes; read its size and contents
+        with ``getbuffer()`` to avoid copying them.
+
+        Args:
+            img (PIL.Image): Image to encode
+            original (bytes): Bytes of the file the image was opened from,
+                returned unchanged by the 'original' encoder
+        """
+        if self.name == 'original' and img.format in ORIGINAL_FORMATS:
+            if original is not None:
+                return io.BytesIO(original), img.format
+            return self._save(img, img.format, {})
+
+        format_type = ENCODER_FORMATS.get(self.name, 'PNG')
+        if format_type == 'PNG':
+            options = {'compress_level': PNG_COMPRESS_LEVEL if self.level is None else self.level}
+        else:
+            options = {'quality': IMAGE_QUALITY if self.level is None else self.level}
+            if format_type == 'WEBP':
+                # Fastest WebP method; the default is about 3x slower on page renders
+                options['method'] = 0
+        return self._save(convert_for_format(img, format_type), format_type, options)
+
+    def _save(self, img, format_type, options):
+        buffer = io.BytesIO()
+        img.save(buffer, format=format_type, **options)
+        return buffer, format_type
+
+def encoder_from_request(request, default=None):
+    """
+    Build the encoder selected by a request's `encoder` and `quality` parameters
+
+    Raises ValueError for unsupported values.
+    """
+    name = get_param(request, 'encoder', default or IMAGE_ENCODER)
+    quality = get_param(request, 'quality')
+    try:
+        level = int(quality) if quality not in (None, '') else None
+    except ValueError:
+        raise ValueError(f"Invalid quality: {quality}")
+    return ImageEncoder(name, level)
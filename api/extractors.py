@@ -0,0 +1,429 @@
+import heapq
+import os
+import threading
+
+from capabilities import is_available, lazy_module, poppler_path
+from embedded import iter_embedded_images
+from metrics import count, stage_timer
+from pdf_metadata import open_pdf_reader, page_size_points
+from placement import get_page_placements
+from rendering import PDF2IMAGE_AVAILABLE, RENDER_CHUNK_SIZE, RENDER_WORKERS, get_render_engine, split_page_list
+from request_params import expand_ranges
+
+# Imported on first use
+Image = lazy_module('PIL.Image')
+PIL_AVAILABLE = is_available('PIL')
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+generic = lazy_module('PyPDF2.generic')
+pdfium = lazy_module('pypdfium2')
+PDFIUM_AVAILABLE = is_available('pypdfium2')
+# PyMuPDF 1.24 renamed its module from fitz to pymupdf
+fitz = lazy_module('pymupdf' if is_available('pymupdf') else 'fitz')
+PYMUPDF_AVAILABLE = is_available(fitz.__name__)
+
+# Backend used to render pages: 'auto' picks one per document, or one of
+# 'poppler', 'pdfium' or 'pymupdf' (used whenever it is installed)
+RENDER_BACKEND = os.environ.get('RENDER_BACKEND', 'auto').lower()
+
+# Values accepted by the `method` parameter of the extraction endpoints
+EXTRACTION_METHODS = ('render', 'embedded', 'auto')
+
+# Share of a page a single image must cover for method=auto to treat the
+# page as a scan and return the image instead of rendering the page
+SCANNED_PAGE_COVERAGE = 0.9
+
+# Content stream operators a scanned page may use besides drawing its image;
+# they change the graphics state but paint nothing
+SCANNED_PAGE_OPERATORS = {b'q', b'Q', b'cm', b'gs'}
+
+class ExtractionBackend:
+    """
+    One way of producing image records from a PDF
+
+    ``kind`` is 'render' for backends that rasterize whole pages (one
+    page_<n>.png record per page) and 'embedded' for backends that return the
+    images stored in the PDF.
+    """
+
+    name = None
+    kind = 'render'
+
+    def available(self):
+        raise NotImplementedError
+
+    def extract(self, source, info_fn, pages=None, dpi=200, encoding='base64', analyze_fn=None,
+                scale_to=None, page_count=None, convert=True):
+        """
+        Yield image info dicts in page order
+
+        Args:
+            source (PdfSource): PDF to extract from
+            info_fn: Function taking (image, filename) and returning an image
+                info dict, e.g. ``get_image_info_from_pil``
+            pages (list): (first, last) page ranges, as returned by
+                parse_ranges; every page when omitted
+            dpi (int): Render resolution
+            encoding (str): 'base64' or 'raw', for images returned as stored
+            analyze_fn: Function returning pixel statistics for a PIL image
+            scale_to (int): Render thumbnails with this longest side instead
+            page_count (int): Number of pages, if already known
+            convert (bool): Decode and re-encode stored images that are not
+                complete image files, see iter_embedded_images
+        """
+        raise NotImplementedError
+
+    def render_page(self, source, page_num, dpi, info_fn):
+        """
+        Render a single page, returning its image info dict
+        """
+        raise NotImplementedError
+
+class PopplerBackend(ExtractionBackend):
+    """
+    Renders with pdftoppm in the render engine's worker processes; the
+    fastest choice for long documents, whose page ranges render in parallel
+    """
+
+    name = 'poppler'
+
+    def available(self):
+        return PDF2IMAGE_AVAILABLE and poppler_path('pdftoppm') is not None
+
+    def extract(self, source, info_fn, pages=None, dpi=200, encoding='base64', analyze_fn=None,
+                scale_to=None, page_count=None, convert=True):
+        return get_render_engine().render(source, dpi=dpi, info_fn=info_fn, page_count=page_count,
+                                          scale_to=scale_to, pages=pages)
+
+    def render_page(self, source, page_num, dpi, info_fn):
+        return get_render_engine().render_page(source, page_num, dpi, info_fn)
+
+class InProcessRenderBackend(ExtractionBackend):
+    """
+    Renders with a PDF library loaded into this process
+
+    There is no process to start and no PPM output to parse, which makes
+    these backends faster than poppler for short documents. The libraries
+    are not thread-safe, so one page renders at a time per backend.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def open(self, source):
+        raise NotImplementedError
+
+    def render_image(self, document, page_num, dpi, scale_to):
+        """
+        PIL image of one page of an open document
+        """
+        raise NotImplementedError
+
+    def extract(self, source, info_fn, pages=None, dpi=200, encoding='base64', analyze_fn=None,
+                scale_to=None, page_count=None, convert=True):
+        with self._lock:
+            document = self.open(source)
+        try:
+            if pages is None:
+                page_numbers = range(1, len(document) + 1)
+            else:
+                page_numbers = expand_ranges(pages, 1, len(document))
+            for page_num in page_numbers:
+                with self._lock, stage_timer('render'):
+                    img = self.render_image(document, page_num, dpi, scale_to)
+                if not scale_to:
+                    # Record the resolution for image analytics, as pdftoppm renders do
+                    img.info['dpi'] = (dpi, dpi)
+                image_info = info_fn(img, f"page_{page_num}.png")
+                img.close()
+                count('pages_rendered')
+                if image_info:
+                    image_info['page'] = page_num
+                    yield image_info
+        finally:
+            with self._lock:
+                document.close()
+
+    def render_page(self, source, page_num, dpi, info_fn):
+        return next(iter(self.extract(source, info_fn, pages=[(page_num, page_num)], dpi=dpi)), None)
+
+class PdfiumBackend(InProcessRenderBackend):
+    """
+    Renders with PDFium through pypdfium2
+    """
+
+    name = 'pdfium'
+
+    def available(self):
+        return PDFIUM_AVAILABLE and PIL_AVAILABLE
+
+    def open(self, source):
+        # PDFium reads bytes directly; memory-mapped uploads go through a file object
+        data = source.data if isinstance(source.data, bytes) else source.open()
+        return pdfium.PdfDocument(data)
+
+    def render_image(self, document, page_num, dpi, scale_to):
+        page = document[page_num - 1]
+        try:
+            scale = scale_to / max(page.get_size()) if scale_to else dpi / 72
+            return page.render(scale=scale).to_pil()
+        finally:
+            page.close()
+
+class PyMuPDFBackend(InProcessRenderBackend):
+    """
+    Renders with MuPDF through PyMuPDF
+    """
+
+    name = 'pymupdf'
+
+    def available(self):
+        return PYMUPDF_AVAILABLE and PIL_AVAILABLE
+
+    def open(self, source):
+        data = source.data if isinstance(source.data, bytes) else source.open().read()
+        return fitz.open(stream=data, filetype='pdf')
+
+    def render_image(self, document, page_num, dpi, scale_to):
+        page = document[page_num - 1]
+        scale = scale_to / max(page.rect.width, page.rect.height) if scale_to else dpi / 72
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+class EmbeddedBackend(ExtractionBackend):
+    """
+    Returns the images stored in the PDF with PyPDF2, without rendering
+    """
+
+    name = 'embedded'
+    kind = 'embedded'
+
+    def available(self):
+        return PYPDF2_AVAILABLE
+
+    def extract(self, source, info_fn, pages=None, dpi=200, encoding='base64', analyze_fn=None,
+                scale_to=None, page_count=None, convert=True):
+        return iter_embedded_images(source, info_fn, convert=convert, encoding=encoding, pages=pages,
+                                    analyze_fn=analyze_fn)
+
+POPPLER = PopplerBackend()
+PDFIUM = PdfiumBackend()
+PYMUPDF = PyMuPDFBackend()
+EMBEDDED = EmbeddedBackend()
+
+# Render backends in order of preference for short documents
+RENDER_BACKENDS = (PDFIUM, PYMUPDF, POPPLER)
+
+def available_backends():
+    """
+    Names of the backends that can run in this process
+    """
+    return [backend.name for backend in (*RENDER_BACKENDS, EMBEDDED) if backend.available()]
+
+def choose_render_backend(page_total=None):
+    """
+    Fastest installed render backend for a document, or None if pages cannot be rendered
+
+    Documents that fit in one render chunk (or any document when rendering
+    is serial) are rendered in-process, which saves starting pdftoppm and
+    parsing its output. Longer documents go to poppler, whose worker
+    processes render page ranges in parallel. RENDER_BACKEND overrides the
+    choice when the named backend is installed.
+
+    Args:
+        page_total (int): Number of pages to render, if known
+    """
+    backends = [backend for backend in RENDER_BACKENDS if backend.available()]
+    if not backends:
+        return None
+    for backend in backends:
+        if backend.name == RENDER_BACKEND:
+            return backend
+    short = page_total is not None and (page_total <= RENDER_CHUNK_SIZE or RENDER_WORKERS <= 1)
+    if POPPLER in backends and not short:
+        return POPPLER
+    return backends[0]
+
+def get_render_backend(page_total=None):
+    """
+    Render backend for ``page_total`` pages, or raise RuntimeError if none is installed
+    """
+    backend = choose_render_backend(page_total)
+    if backend is None:
+        raise RuntimeError("No render backend is installed")
+    return backend
+
+def _is_scanned_page(page):
+    # A scanned page does nothing but draw a single image over (almost) the
+    # whole page. Text (including OCR text layers), vector graphics, inline
+    # images and Form XObjects would be lost by returning the image, so any
+    # of them makes the page be rendered
+    resources = page.get('/Resources')
+    resources = resources.get_object() if resources is not None else {}
+    if resources.get('/Font'):
+        return False
+    xobjects = resources['/XObject'].get_object() if '/XObject' in resources else {}
+    if len(xobjects) != 1:
+        return False
+    image = next(iter(xobjects))
+    if xobjects[image].get_object().get('/Subtype') != '/Image':
+        return False
+
+    contents = page.get_contents()
+    if contents is None:
+        return False
+    draws = 0
+    for operands, operator in generic.ContentStream(contents, page.pdf).operations:
+        if operator == b'Do' and operands and operands[0] == image:
+            draws += 1
+        elif operator not in SCANNED_PAGE_OPERATORS:
+            return False
+    if draws != 1:
+        return False
+
+    ctms = get_page_placements(page).get(image, [])
+    width_pt, height_pt = page_size_points(page)
+    # Area of the unit square mapped through the CTM
+    covered = max((abs(a * d - b * c) for a, b, c, d, e, f in ctms), default=0)
+    return covered >= SCANNED_PAGE_COVERAGE * width_pt * height_pt
+
+def scan_document(source, pages=None, classify=False, sizes=False):
+    """
+    Cheap look at a PDF's structure, used to plan its extraction
+
+    Only the page tree and page dictionaries are read; no image is decoded.
+    Returns a dict with 'page_count' (None if PyPDF2 cannot read the PDF),
+    'pages' (the selected page numbers, or None), 'page_sizes' (displayed
+    sizes in points, with ``sizes``) and 'scanned_pages' (with ``classify``,
+    the selected pages that are a single full-page image without text).
+    """
+    scan = {'page_count': None, 'pages': None, 'page_sizes': [], 'scanned_pages': set()}
+    if not PYPDF2_AVAILABLE:
+        return scan
+    try:
+        pdf_reader = open_pdf_reader(source)
+        scan['page_count'] = len(pdf_reader.pages)
+        scan['pages'] = expand_ranges(pages or [(1, None)], 1, scan['page_count'])
+        if sizes:
+            scan['page_sizes'] = [page_size_points(page) for page in pdf_reader.pages]
+        if classify:
+            scan['scanned_pages'] = {
+                page_num for page_num in scan['pages'] if _is_scanned_page(pdf_reader.pages[page_num - 1])
+            }
+    except Exception as e:
+        print(f"Error scanning PDF: {e}")
+    return scan
+
+class ExtractionPlan:
+    """
+    Backends chosen for a document, with the pages each one handles
+
+    ``steps`` is a list of (backend, page ranges) whose records are merged
+    in page order. ``fallback`` extracts the selected pages when the steps
+    produce nothing, e.g. when poppler cannot open the PDF; a plan without
+    steps goes straight to it.
+    """
+
+    def __init__(self, scan, steps, fallback=None, pages=None):
+        self.scan = scan
+        self.steps = steps
+        self.fallback = fallback
+        self.pages = pages
+
+    @property
+    def backends(self):
+        return [backend.name for backend, _ in self.steps]
+
+    def run(self, source, info_fn, dpi=200, encoding='base64', analyze_fn=None, scale_to=None, strict=False,
+            convert=True):
+        """
+        Yield the image records of every step, in page order
+
+        Backend errors are logged and end the stream early (after trying the
+        fallback if nothing was found). With ``strict`` they are raised
+        instead, unless the fallback recovers, so a PDF that cannot be read
+        fails rather than yielding no images. Other args are as for
+        ExtractionBackend.extract.
+        """
+        found = 0
+        streams = [
+            self._count(backend.extract(source, info_fn, pages=pages, dpi=dpi, encoding=encoding,
+                                        analyze_fn=analyze_fn, scale_to=scale_to,
+                                        page_count=self.scan['page_count'], convert=convert),
+                        self._label(backend, scale_to))
+            for backend, pages in self.steps
+        ]
+        try:
+            for image_info in heapq.merge(*streams, key=lambda image_info: image_info['page']):
+                found += 1
+                yield image_info
+        except Exception as e:
+            if strict and (found or self.fallback is None):
+                raise
+            print(f"{'/'.join(self.backends)} extraction failed: {e}")
+
+        if not found and self.fallback is not None:
+            count('render_fallbacks')
+            try:
+                yield from self._count(self.fallback.extract(source, info_fn, pages=self.pages, encoding=encoding,
+                                                             analyze_fn=analyze_fn, convert=convert), 'fallback')
+            except Exception as e:
+                if strict:
+                    raise
+                print(f"{self.fallback.name} extraction failed: {e}")
+
+    def _label(self, backend, scale_to):
+        if backend.kind == 'embedded':
+            return 'embedded'
+        return 'thumbnail' if scale_to else 'render'
+
+    def _count(self, images, label):
+        for image_info in images:
+            count('images_extracted', method=label)
+            yield image_info
+
+def plan_extraction(source, method='render', pages=None, thumbnails=False):
+    """
+    Choose the backends that extract a document, before any of them runs
+
+    - 'embedded': the images stored in the PDF
+    - 'render': every page rendered by the fastest installed render backend
+      (see choose_render_backend); when none is installed the embedded images
+      are returned instead, without trying to render
+    - 'auto': like 'render', except that scanned pages (see scan_document)
+      return their scan as stored, which is faster and loses no resolution
+
+    Args:
+        source (PdfSource): PDF to extract from
+        method (str): One of EXTRACTION_METHODS
+        pages (list): (first, last) page ranges, as returned by parse_ranges
+        thumbnails (bool): Whether pages are rendered as thumbnails, which
+            need the page sizes
+    """
+    scan = scan_document(source, pages, classify=method == 'auto', sizes=thumbnails)
+    embedded = EMBEDDED if EMBEDDED.available() else None
+
+    if method == 'embedded':
+        steps = [(embedded, pages)] if embedded else []
+        return ExtractionPlan(scan, steps, pages=pages)
+
+    scanned = sorted(scan['scanned_pages']) if embedded else []
+    render_pages = scan['pages']
+    if scanned:
+        render_pages = [page for page in render_pages if page not in scan['scanned_pages']]
+    renderer = choose_render_backend(len(render_pages) if render_pages is not None else None)
+
+    if renderer is None:
+        # Nothing can render pages; go straight to the embedded images
+        return ExtractionPlan(scan, [], fallback=embedded, pages=pages)
+    if scanned:
+        steps = [(embedded, split_page_list(scanned, len(scanned)))]
+        if render_pages:
+            steps.append((renderer, split_page_list(render_pages, len(render_pages))))
+        fallback = None
+    else:
+        steps = [(renderer, pages)]
+        fallback = embedded
+
+    for backend, _ in steps:
+        count('backends_selected', backend=backend.name)
+    return ExtractionPlan(scan, steps, fallback=fallback, pages=pages)
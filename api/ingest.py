@@ -0,0 +1,179 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+
+from flask import g, has_request_context
+
+from metrics import stage_timer
+
+# Uploads larger than this are spooled to a memory-mapped temporary file
+# instead of being held in a bytes object
+INGEST_SPOOL_MB = float(os.environ.get('INGEST_SPOOL_MB', '32'))
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+class MappedReader(io.RawIOBase):
+    """
+    Independent read-only file view over a memory map
+
+    Each reader keeps its own position, so several backends can parse the
+    same mapping at once. Reads return copies of just the requested range and
+    never export the mapping's buffer, so it can always be closed.
+    """
+
+    def __init__(self, mapping):
+        self._mapping = mapping
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._mapping)
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer):
+        data = self._mapping[self._position:self._position + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+class PdfSource:
+    """
+    A PDF read once into memory (or a memory-mapped file) and shared by every backend
+
+    ``data`` is a bytes-like buffer that can be hashed or fed to pdftoppm over
+    stdin; ``open()`` returns a new file object over it without copying.
+    """
+
+    def __init__(self, data, owned_file=None):
+        self.data = data
+        self._owned_file = owned_file
+
+    @classmethod
+    def from_upload(cls, pdf_file, spool_bytes=None):
+        """
+        Read an uploaded file once
+
+        File-backed uploads are mapped directly, including Werkzeug's
+        SpooledTemporaryFile once it has rolled over to disk (uploads past
+        500 KB). Other streams, such as small in-memory spools, are read into
+        memory, switching to a memory-mapped temporary file once they grow
+        past ``spool_bytes``.
+        """
+        if spool_bytes is None:
+            spool_bytes = int(INGEST_SPOOL_MB * 1024 * 1024)
+        stream = getattr(pdf_file, 'stream', pdf_file)
+
+        with stage_timer('ingest'):
+            mapping = _map_file(stream)
+            if mapping is not None:
+                return cls(mapping)
+
+            stream.seek(0)
+            chunks = []
+            size = 0
+            while True:
+                chunk = stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return cls(b''.join(chunks))
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > spool_bytes:
+                    break
+
+            spool = tempfile.TemporaryFile()
+            spool.writelines(chunks)
+            del chunks
+            for chunk in iter(lambda: stream.read(READ_CHUNK_SIZE), b''):
+                spool.write(chunk)
+            spool.flush()
+            return cls(mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ), spool)
+
+    def __len__(self):
+        return len(self.data)
+
+    def open(self):
+        """
+        New independent file object over the buffer
+        """
+        if isinstance(self.data, mmap.mmap):
+            return io.BufferedReader(MappedReader(self.data))
+        return io.BytesIO(self.data)
+
+    def sha256(self):
+        return hashlib.sha256(self.data).hexdigest()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._owned_file is not None:
+            self._owned_file.close()
+            self._owned_file = None
+
+def _map_file(stream):
+    if isinstance(stream, tempfile.SpooledTemporaryFile) and stream.name is None:
+        # Only spools still held in memory have no name; fileno() would roll
+        # them over to disk just to map them, so they are read instead
+        return None
+    try:
+        stream.flush()
+        fileno = stream.fileno()
+        if os.fstat(fileno).st_size == 0:
+            return None
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+def as_pdf_source(pdf):
+    """
+    Wrap bytes or a file object in a PdfSource; PdfSources are returned as is
+    """
+    if isinstance(pdf, PdfSource):
+        return pdf
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return PdfSource(bytes(pdf))
+    return PdfSource.from_upload(pdf)
+
+def open_pdf_stream(pdf):
+    """
+    File object for a PdfSource, bytes, or an existing file object
+    """
+    if isinstance(pdf, PdfSource):
+        return pdf.open()
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return io.BytesIO(pdf)
+    return pdf
+
+def open_pdf_upload(pdf_file):
+    """
+    Read a request's PDF upload once, closing it when the request ends
+
+    For streamed responses the request (and so the source) lives until the
+    last chunk has been sent.
+    """
+    source = PdfSource.from_upload(pdf_file)
+    if has_request_context():
+        g.setdefault('pdf_sources', []).append(source)
+    return source
+
+def init_app(app):
+    """
+    Register the teardown hook that releases request PDF sources
+    """
+    @app.teardown_request
+    def close_pdf_sources(exc):
+        for source in g.pop('pdf_sources', []):
+            source.close()
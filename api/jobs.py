@@ -0,0 +1,335 @@
+import io
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from capabilities import is_available, lazy_module
+from ingest import PdfSource
+from request_params import expand_ranges
+
+# Imported on first use
+PyPDF2 = lazy_module('PyPDF2')
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+
+# Job state backend: 'memory' (single process) or 'sqlite' (visible to every
+# worker process that points at the same JOB_DB_PATH; each job still runs in
+# the process it was submitted to)
+JOB_STORE = os.environ.get('JOB_STORE', 'memory')
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'pdf-image-jobs.sqlite3'))
+
+# Background threads that process queued jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+
+# Jobs that may be queued or running at once per process; each holds its PDF
+# in memory until it finishes, so further submissions are turned away
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', str(JOB_WORKERS * 4)))
+
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', '3600'))
+
+JOB_FIELDS = ('id', 'status', 'pages_done', 'pages_total', 'total_images',
+              'error', 'created_at', 'updated_at')
+
+class JobQueueFull(Exception):
+    """
+    Raised by JobManager.submit when JOB_QUEUE_SIZE jobs are already pending
+    """
+
+class JobStore:
+    """
+    Interface for job state backends
+
+    A job is a dict with the keys in JOB_FIELDS plus 'images', the list of
+    extracted image records once the job has finished.
+    """
+
+    def create(self, job):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def delete_expired(self, before):
+        """
+        Remove finished jobs last updated before the given timestamp
+        """
+        raise NotImplementedError
+
+    def fail_orphaned(self, is_alive):
+        """
+        Mark failed the unfinished jobs whose process has exited
+
+        Args:
+            is_alive: Function taking a job's owner and returning whether
+                that process is still running
+        """
+        # Jobs kept in memory end with their process
+
+class MemoryJobStore(JobStore):
+    """
+    Keeps jobs in a dict; state is lost on restart and not shared between processes
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        job = dict(job)
+        # Only the SQLite store needs to know which process runs a job
+        job.pop('owner', None)
+        with self._lock:
+            self._jobs[job['id']] = job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def delete_expired(self, before):
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job['status'] in ('done', 'failed') and job['updated_at'] < before]:
+                del self._jobs[job_id]
+
+class SQLiteJobStore(JobStore):
+    """
+    Stores jobs in a SQLite database file so every process on the host sees them
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT, pages_done INTEGER, '
+                'pages_total INTEGER, total_images INTEGER, error TEXT, '
+                'created_at REAL, updated_at REAL, images TEXT)'
+            )
+            # Databases created before jobs recorded the process running them
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(jobs)')]
+            if 'owner' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, job):
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}, images, owner) "
+                f"VALUES ({', '.join('?' * (len(JOB_FIELDS) + 2))})",
+                [job.get(field) for field in JOB_FIELDS] + [json.dumps(job.get('images')), job.get('owner')]
+            )
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        if 'images' in fields:
+            fields['images'] = json.dumps(fields['images'])
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop('owner', None)
+        job['images'] = json.loads(job['images']) if job['images'] else None
+        return job
+
+    def delete_expired(self, before):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (before,)
+            )
+
+    def fail_orphaned(self, is_alive):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        for row in rows:
+            if not is_alive(row['owner']):
+                self.update(row['id'], status='failed', error='The server process running the job exited')
+
+def count_pages(pdf_bytes, pages=None):
+    """
+    Number of pages a job will process, or None if it cannot be determined cheaply
+
+    Args:
+        pdf_bytes (bytes): Raw PDF data
+        pages (list): (first, last) page ranges, as returned by parse_ranges;
+            every page when omitted
+    """
+    if not PYPDF2_AVAILABLE:
+        return None
+    try:
+        page_count = len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+    except Exception:
+        return None
+    return len(expand_ranges(pages, 1, page_count)) if pages is not None else page_count
+
+def process_owner():
+    """
+    Identifies this process in the jobs it runs
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def owner_alive(owner):
+    """
+    Whether the process that owns a job is still running
+
+    Processes on other hosts (or owners that cannot be parsed) are assumed
+    to be alive, since they cannot be checked from here.
+    """
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, as another user
+        pass
+    return True
+
+class JobManager:
+    """
+    Runs extraction jobs on background threads and records their progress
+
+    Jobs run in the process they were submitted to. Jobs left unfinished by
+    a process that has exited (e.g. a restarted worker sharing a SQLite
+    store) are marked failed when the next manager starts, and then expire
+    like any other finished job.
+    """
+
+    def __init__(self, store, workers, queue_size=None):
+        self.store = store
+        self.queue_size = JOB_QUEUE_SIZE if queue_size is None else queue_size
+        self.owner = process_owner()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.store.fail_orphaned(owner_alive)
+
+    def submit(self, pdf_bytes, extract_fn, pages=None):
+        """
+        Queue a PDF for extraction and return the new job's id
+
+        Raises JobQueueFull when queue_size jobs are already queued or running.
+
+        Args:
+            pdf_bytes (bytes): Raw PDF data
+            extract_fn: Function taking a PdfSource and returning an
+                iterator of image info dicts; exceptions it raises fail the job
+            pages (list): (first, last) page ranges extract_fn is limited
+                to, for the job's page total
+        """
+        with self._lock:
+            if self._pending >= self.queue_size:
+                raise JobQueueFull(f"{self._pending} jobs are already queued, retry later")
+            self._pending += 1
+
+        try:
+            now = time.time()
+            self.store.delete_expired(now - JOB_TTL_SECONDS)
+
+            job_id = uuid.uuid4().hex
+            self.store.create({
+                'id': job_id,
+                'status': 'queued',
+                'pages_done': 0,
+                'pages_total': count_pages(pdf_bytes, pages),
+                'total_images': 0,
+                'error': None,
+                'created_at': now,
+                'updated_at': now,
+                'images': None,
+                'owner': self.owner
+            })
+            self._executor.submit(self._run, job_id, pdf_bytes, extract_fn)
+        except Exception:
+            self._finished()
+            raise
+        return job_id
+
+    def _finished(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, job_id, pdf_bytes, extract_fn):
+        images = []
+        pages_done = 0
+        last_page = None
+        source = PdfSource(pdf_bytes)
+        try:
+            # Inside the try, so a store error fails the job and still frees its place
+            self.store.update(job_id, status='running')
+            for image_info in extract_fn(source):
+                images.append(image_info)
+                # Records arrive in page order; count each page once
+                page = image_info.get('page')
+                if page and page != last_page:
+                    last_page = page
+                    pages_done += 1
+                    self.store.update(job_id, pages_done=pages_done, total_images=len(images))
+
+            job = self.store.get(job_id) or {}
+            result = {
+                'status': 'done',
+                'pages_done': job.get('pages_total') or pages_done,
+                'total_images': len(images),
+                'images': images
+            }
+        except Exception as e:
+            print(f"Error processing job {job_id}: {e}")
+            result = {'status': 'failed', 'error': str(e)}
+        finally:
+            source.close()
+            # Free the job's place in the queue before it is reported finished
+            self._finished()
+        self.store.update(job_id, **result)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+def create_job_store(kind=None):
+    """
+    Build the job store selected by JOB_STORE
+    """
+    kind = (kind or JOB_STORE).lower()
+    if kind == 'sqlite':
+        return SQLiteJobStore(JOB_DB_PATH)
+    if kind == 'memory':
+        return MemoryJobStore()
+    raise ValueError(f"Unknown job store: {kind}")
+
+_manager = None
+
+def get_job_manager():
+    """
+    Get the job manager shared by every request in this process
+    """
+    global _manager
+    if _manager is None:
+        _manager = JobManager(create_job_store(), JOB_WORKERS)
+    return _manager
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Print one JSON line per request with its stage timings and counts
+TRACE_LOG = os.environ.get('TRACE_LOG', '').lower() in ('1', 'true', 'yes', 'on')
+
+METRIC_PREFIX = 'pdf_api'
+
+class MetricsRegistry:
+    """
+    Process-wide counters and timing summaries, rendered in Prometheus text format
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            total, count = self._summaries.get(key, (0.0, 0))
+            self._summaries[key] = (total + value, count + 1)
+
+    def render(self):
+        """
+        Exposition text for the /metrics endpoint
+        """
+        def series(name, labels, suffix=''):
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            return f"{METRIC_PREFIX}_{name}{suffix}" + (f"{{{label_text}}}" if label_text else '')
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+                typed.add(name)
+            lines.append(f"{series(name, labels)} {value}")
+        for (name, labels), (total, count) in summaries:
+            if name not in typed:
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} summary")
+                typed.add(name)
+            lines.append(f"{series(name, labels, '_sum')} {total:.6f}")
+            lines.append(f"{series(name, labels, '_count')} {count}")
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+_capture = threading.local()
+
+def _current_trace():
+    if has_request_context():
+        return g.get('metrics_trace')
+    return None
+
+def record_stage(stage, seconds):
+    """
+    Record time spent in an extraction stage
+
+    Inside ``capture_stages()`` the time is only collected locally (used in
+    worker processes, whose registry is not the one /metrics reports).
+    """
+    captured = getattr(_capture, 'stages', None)
+    if captured is not None:
+        captured[stage] = captured.get(stage, 0.0) + seconds
+        return
+
+    registry.observe('stage_seconds', seconds, stage=stage)
+    trace = _current_trace()
+    if trace is not None:
+        trace['stages'][stage] = trace['stages'].get(stage, 0.0) + seconds
+
+def record_stages(stages):
+    """
+    Record stage totals collected elsewhere, e.g. returned by a worker process
+    """
+    for stage, seconds in stages.items():
+        record_stage(stage, seconds)
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Time a block of hot-path code as the given stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+@contextmanager
+def capture_stages():
+    """
+    Collect stage timings into a dict instead of the registry
+    """
+    previous = getattr(_capture, 'stages', None)
+    _capture.stages = {}
+    try:
+        yield _capture.stages
+    finally:
+        _capture.stages = previous
+
+def count(name, value=1, **labels):
+    """
+    Increment a counter, and the matching per-request count when in a request
+    """
+    registry.increment(f"{name}_total", value, **labels)
+    trace = _current_trace()
+    if trace is not None:
+        trace['counts'][name] = trace['counts'].get(name, 0) + value
+
+def _finish_trace(trace, status_code):
+    duration = time.perf_counter() - trace['start']
+    labels = {'endpoint': trace['endpoint'], 'status': str(status_code)}
+    registry.increment('requests_total', **labels)
+    registry.observe('request_seconds', duration, endpoint=trace['endpoint'])
+    registry.increment('response_bytes_total', trace['response_bytes'], endpoint=trace['endpoint'])
+
+    if TRACE_LOG:
+        print(json.dumps({
+            'event': 'request_trace',
+            'endpoint': trace['endpoint'],
+            'status': status_code,
+            'duration_seconds': round(duration, 6),
+            'response_bytes': trace['response_bytes'],
+            'stages': {stage: round(seconds, 6) for stage, seconds in trace['stages'].items()},
+            'counts': trace['counts']
+        }), flush=True)
+
+def _count_bytes(chunks, trace):
+    for chunk in chunks:
+        trace['response_bytes'] += len(chunk)
+        yield chunk
+
+def init_app(app):
+    """
+    Register per-request tracing hooks and the /metrics endpoint on an app
+    """
+    @app.before_request
+    def start_trace():
+        g.metrics_trace = {
+            'endpoint': request.endpoint or 'unknown',
+            'start': time.perf_counter(),
+            'stages': {},
+            'counts': {},
+            'response_bytes': 0
+        }
+
+    @app.after_request
+    def end_trace(response):
+        trace = g.get('metrics_trace')
+        if trace is None or trace['endpoint'] == 'metrics':
+            return response
+
+        if response.is_streamed:
+            # Streamed bodies are produced after this hook; finish the trace
+            # once the last chunk has been sent
+            response.response = _count_bytes(response.response, trace)
+            response.call_on_close(lambda: _finish_trace(trace, response.status_code))
+        else:
+            trace['response_bytes'] = response.content_length or 0
+            _finish_trace(trace, response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,266 @@
+import math
+from math import gcd
+
+from capabilities import lazy_module
+from ingest import open_pdf_stream
+from placement import get_page_placements, placement_fields
+from request_params import expand_ranges
+
+# Imported on first use
+PyPDF2 = lazy_module('PyPDF2')
+
+# PIL modes for the PDF colour spaces that carry a fixed component count
+COLOR_SPACE_MODES = {
+    '/DeviceRGB': 'RGB',
+    '/CalRGB': 'RGB',
+    '/DeviceGray': 'L',
+    '/CalGray': 'L',
+    '/DeviceCMYK': 'CMYK',
+    '/Indexed': 'P',
+    '/Lab': 'LAB',
+}
+
+ICC_COMPONENT_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+# Filters whose encoded stream is already a standalone image file, mapped to
+# the reported format and the file extension used for the filename
+PASSTHROUGH_FILTERS = {
+    '/DCTDecode': ('JPEG', 'jpg'),
+    '/JPXDecode': ('JPEG2000', 'jp2'),
+    '/JBIG2Decode': ('JBIG2', 'jb2'),
+}
+
+def stream_filters(xobj):
+    """
+    An image stream's /Filter entry as a list of filter names
+    """
+    filters = xobj.get('/Filter')
+    if filters is None:
+        return []
+    filters = filters.get_object()
+    if isinstance(filters, list):
+        return [f.get_object() for f in filters]
+    return [filters]
+
+def stored_format(xobj):
+    """
+    (format, extension) an image XObject is returned as by embedded extraction
+
+    Passthrough images keep their own format; every other image is decoded
+    and encoded as PNG.
+    """
+    filters = stream_filters(xobj)
+    if filters and filters[-1] in PASSTHROUGH_FILTERS:
+        return PASSTHROUGH_FILTERS[filters[-1]]
+    return 'PNG', 'png'
+
+def embedded_image_filename(page_num, name, extension=None):
+    """
+    Filename of an embedded image, e.g. "embedded_image_3_Fm0_Im1.png"
+
+    Args:
+        page_num (int): Page the image is drawn on
+        name (str): Resource path, as reported by ``iter_image_xobjects``
+        extension (str): File extension; omitted for records without image
+            data
+    """
+    filename = f"embedded_image_{page_num}_{name.replace('/', '_').lstrip('_')}"
+    return f"{filename}.{extension}" if extension else filename
+
+def aspect_ratio(width, height):
+    """
+    Simplified aspect ratio string such as "16:9"
+    """
+    aspect_gcd = gcd(width, height) or 1
+    return f"{width//aspect_gcd}:{height//aspect_gcd}"
+
+def get_image_metadata(img, filename, file_size=None):
+    """
+    Describe a PIL Image using only its header
+
+    ``Image.open`` parses the header lazily, so nothing here decodes pixels or
+    re-encodes the image.
+
+    Args:
+        img (PIL.Image): Opened (not loaded) PIL Image object
+        filename (str): Name of the image file
+        file_size (int): Size of the original file in bytes, if known
+    """
+    width, height = img.size
+    return {
+        'filename': filename,
+        'width': width,
+        'height': height,
+        'format': img.format or 'Unknown',
+        'mode': img.mode,
+        'file_size': file_size,
+        'aspect_ratio': aspect_ratio(width, height)
+    }
+
+def color_space_to_mode(color_space, bits_per_component=8):
+    """
+    Map a PDF /ColorSpace entry to the closest PIL mode name
+    """
+    if color_space is None:
+        return 'Unknown'
+    color_space = color_space.get_object()
+
+    if isinstance(color_space, list) and color_space:
+        family = color_space[0]
+        if family == '/ICCBased':
+            components = color_space[1].get_object().get('/N')
+            return ICC_COMPONENT_MODES.get(components, 'Unknown')
+        if family in ('/Separation', '/DeviceN'):
+            return 'L'
+        color_space = family
+
+    mode = COLOR_SPACE_MODES.get(color_space, 'Unknown')
+    if mode == 'L' and bits_per_component == 1:
+        return '1'
+    return mode
+
+def raw_stream_length(stream):
+    """
+    Length of a stream's encoded bytes, without decoding it
+    """
+    # PyPDF2 drops /Length from the dictionary once the stream is read and
+    # keeps the undecoded bytes on the private _data attribute
+    data = getattr(stream, '_data', None)
+    return len(data) if data is not None else None
+
+def page_size_points(page):
+    """
+    Displayed (width, height) of a PyPDF2 page in points, after /Rotate
+    """
+    # pdftoppm renders the crop box (which defaults to the media box)
+    box = page.cropbox
+    width_pt, height_pt = float(box.width), float(box.height)
+    if int(page.get('/Rotate', 0) or 0) % 180:
+        width_pt, height_pt = height_pt, width_pt
+    return width_pt, height_pt
+
+def open_pdf_reader(pdf_file):
+    """
+    PdfReader for a PdfSource, bytes or file object; PdfReaders are returned as is
+    """
+    if isinstance(pdf_file, PyPDF2.PdfReader):
+        return pdf_file
+    return PyPDF2.PdfReader(open_pdf_stream(pdf_file))
+
+def iter_image_xobjects(pdf_reader, pages=None):
+    """
+    Walk every page's image XObjects, including those nested in Form XObjects
+
+    Yields (page_number, name, reference, xobject) where name is the resource
+    path (e.g. "/Fm0/Im1") and reference is the IndirectObject, or None for
+    direct objects. ``pages`` limits the walk to the given page numbers; other
+    pages are never parsed.
+    """
+    if pages is None:
+        pages = range(1, len(pdf_reader.pages) + 1)
+    for page_num in pages:
+        try:
+            resources = pdf_reader.pages[page_num - 1].get('/Resources')
+            yield from _walk_resources(page_num, resources, '', set())
+        except Exception as e:
+            print(f"Error processing page {page_num}: {e}")
+            continue
+
+def _walk_resources(page_num, resources, prefix, visited):
+    if resources is None:
+        return
+    resources = resources.get_object()
+    if '/XObject' not in resources:
+        return
+
+    xObject = resources['/XObject'].get_object()
+    for obj in xObject:
+        try:
+            reference = xObject.raw_get(obj)
+            if not isinstance(reference, PyPDF2.generic.IndirectObject):
+                reference = None
+            xobj = xObject[obj].get_object()
+            subtype = xobj.get('/Subtype')
+            name = prefix + obj
+
+            if subtype == '/Image':
+                yield page_num, name, reference, xobj
+            elif subtype == '/Form':
+                # Guard against forms that (directly or indirectly) use themselves
+                key = reference.idnum if reference is not None else id(xobj)
+                if key in visited:
+                    continue
+                yield from _walk_resources(page_num, xobj.get('/Resources'), name, visited | {key})
+        except Exception as e:
+            print(f"Error extracting embedded image: {e}")
+            continue
+
+def _page_pixel_size(page, dpi):
+    width_pt, height_pt = page_size_points(page)
+    return (
+        math.ceil(round(width_pt * dpi / 72, 6)),
+        math.ceil(round(height_pt * dpi / 72, 6))
+    )
+
+def iter_pdf_metadata(pdf_file, dpi=200, pages=None):
+    """
+    Describe a PDF's pages and embedded images without rendering or decoding
+
+    Page sizes come from each page's crop/media box at the given render DPI;
+    embedded images, including those nested in Form XObjects, are described
+    from their XObject dictionaries under the filename and format embedded
+    extraction would return them with, and with the size and effective DPI
+    they are drawn at from a scan of the page's content stream. No image
+    stream is decoded and nothing is base64 encoded.
+
+    Args:
+        pdf_file: PdfSource, bytes, file object or an already parsed PdfReader
+        dpi (int): Resolution the page images would be rendered at
+        pages (list): (first, last) page ranges to describe, as returned by
+            parse_ranges; every page when omitted
+    """
+    pdf_reader = open_pdf_reader(pdf_file)
+    page_count = len(pdf_reader.pages)
+    page_numbers = expand_ranges(pages, 1, page_count) if pages is not None else range(1, page_count + 1)
+
+    for page_num in page_numbers:
+        page = pdf_reader.pages[page_num - 1]
+        width, height = _page_pixel_size(page, dpi)
+        yield {
+            'filename': f"page_{page_num}.png",
+            'source': 'page',
+            'page': page_num,
+            'width': width,
+            'height': height,
+            'format': 'PNG',
+            'mode': 'RGB',
+            'file_size': None,
+            'aspect_ratio': aspect_ratio(width, height)
+        }
+
+        # Images are named and described as embedded extraction returns them
+        placements = None
+        for _, name, _, xobj in iter_image_xobjects(pdf_reader, [page_num]):
+            try:
+                if placements is None:
+                    placements = get_page_placements(page)
+                width, height = int(xobj['/Width']), int(xobj['/Height'])
+                bits = int(xobj['/BitsPerComponent']) if '/BitsPerComponent' in xobj else 8
+                format_type, extension = stored_format(xobj)
+                image_info = {
+                    'filename': embedded_image_filename(page_num, name, extension),
+                    'source': 'xobject',
+                    'page': page_num,
+                    'width': width,
+                    'height': height,
+                    'format': format_type,
+                    'mode': '1' if xobj.get('/ImageMask') else color_space_to_mode(xobj.get('/ColorSpace'), bits),
+                    'bits_per_component': bits,
+                    'file_size': raw_stream_length(xobj),
+                    'aspect_ratio': aspect_ratio(width, height)
+                }
+                image_info.update(placement_fields(placements.get(name), width, height))
+                yield image_info
+            except Exception as e:
+                print(f"Error reading image metadata: {e}")
+                continue
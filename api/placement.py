@@ -0,0 +1,151 @@
+import math
+
+from capabilities import is_available, lazy_module
+from metrics import stage_timer
+
+# Imported on first use
+PyPDF2 = lazy_module('PyPDF2')
+generic = lazy_module('PyPDF2.generic')
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# Form XObjects nested deeper than this are not scanned
+MAX_FORM_DEPTH = 12
+
+def multiply(m1, m2):
+    """
+    Product m1 x m2 of two PDF matrices given as (a, b, c, d, e, f)
+
+    ``cm`` and a form's /Matrix apply as ``multiply(matrix, ctm)``.
+    """
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + b1 * c2,
+        a1 * b2 + b1 * d2,
+        c1 * a2 + d1 * c2,
+        c1 * b2 + d1 * d2,
+        e1 * a2 + f1 * c2 + e2,
+        e1 * b2 + f1 * d2 + f2
+    )
+
+def _matrix(operands):
+    try:
+        matrix = tuple(float(value) for value in operands)
+    except (TypeError, ValueError):
+        return None
+    return matrix if len(matrix) == 6 else None
+
+def _xobjects(resources):
+    if resources is None:
+        return None
+    resources = resources.get_object()
+    if '/XObject' not in resources:
+        return None
+    return resources['/XObject'].get_object()
+
+def scan_page_placements(page):
+    """
+    Find where every image XObject is drawn on a page
+
+    Walks the page's content stream operators, tracking the current
+    transformation matrix through ``q``/``Q``/``cm`` and into Form XObjects
+    (with their /Matrix). Nothing is rendered and image streams are never
+    read. Pages without XObjects are skipped without parsing their content.
+
+    Returns a dict mapping each image's resource path (e.g. "/Fm0/Im1", as
+    reported by ``iter_image_xobjects``) to the list of CTMs it is drawn with,
+    in points.
+    """
+    placements = {}
+    xobjects = _xobjects(page.get('/Resources'))
+    if not xobjects:
+        return placements
+
+    contents = page.get_contents()
+    if contents is None:
+        return placements
+
+    # /UserUnit scales default user space to multiples of 1/72 inch
+    user_unit = float(page.get('/UserUnit', 1) or 1)
+    ctm = (user_unit, 0.0, 0.0, user_unit, 0.0, 0.0)
+    with stage_timer('placement_scan'):
+        _scan(generic.ContentStream(contents, page.pdf), xobjects, ctm, '', page.pdf, placements, set())
+    return placements
+
+def get_page_placements(page):
+    """
+    Like scan_page_placements, but returns {} for pages that cannot be scanned
+    """
+    if not PYPDF2_AVAILABLE:
+        return {}
+    try:
+        return scan_page_placements(page)
+    except Exception as e:
+        print(f"Error scanning image placements: {e}")
+        return {}
+
+def _scan(content, xobjects, ctm, prefix, pdf, placements, visited):
+    stack = []
+    for operands, operator in content.operations:
+        if operator == b'q':
+            stack.append(ctm)
+        elif operator == b'Q':
+            if stack:
+                ctm = stack.pop()
+        elif operator == b'cm':
+            matrix = _matrix(operands)
+            if matrix is not None:
+                ctm = multiply(matrix, ctm)
+        elif operator == b'Do' and operands:
+            name = operands[0]
+            if name not in xobjects:
+                continue
+            reference = xobjects.raw_get(name)
+            xobj = xobjects[name].get_object()
+            subtype = xobj.get('/Subtype')
+            path = prefix + name
+            if subtype == '/Image':
+                placements.setdefault(path, []).append(ctm)
+            elif subtype == '/Form':
+                # Only forms that contain XObjects can place images
+                form_xobjects = _xobjects(xobj.get('/Resources'))
+                key = reference.idnum if isinstance(reference, generic.IndirectObject) else id(xobj)
+                if not form_xobjects or key in visited or len(visited) >= MAX_FORM_DEPTH:
+                    continue
+                form_ctm = multiply(_matrix(xobj.get('/Matrix', IDENTITY)) or IDENTITY, ctm)
+                _scan(generic.ContentStream(xobj, pdf), form_xobjects, form_ctm, path, pdf, placements, visited | {key})
+
+def placement_fields(ctms, width, height):
+    """
+    Fields describing how an image of width x height pixels is drawn
+
+    The image's unit square is mapped through each CTM; the lengths of the
+    transformed edges give the placed size in points, and the pixels per
+    inch along each edge the effective DPI. ``effective_dpi`` is the lowest
+    DPI over every placement and both axes, the one that limits print
+    quality; it is None if the image is never drawn.
+
+    Args:
+        ctms (list): Matrices the image is drawn with, from scan_page_placements
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+    """
+    placements = []
+    for a, b, c, d, e, f in ctms or []:
+        width_pt = math.hypot(a, b)
+        height_pt = math.hypot(c, d)
+        if not width_pt or not height_pt:
+            continue
+        placements.append({
+            'width_pt': round(width_pt, 2),
+            'height_pt': round(height_pt, 2),
+            'dpi_x': round(width * 72 / width_pt, 1),
+            'dpi_y': round(height * 72 / height_pt, 1)
+        })
+    effective_dpi = min((min(p['dpi_x'], p['dpi_y']) for p in placements), default=None)
+    return {
+        'placements': placements,
+        'effective_dpi': effective_dpi
+    }
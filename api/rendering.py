@@ -0,0 +1,319 @@
+import math
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+from capabilities import is_available, lazy_module, poppler_path
+from metrics import capture_stages, count, record_stages, stage_timer
+from request_params import expand_ranges
+
+# Imported on first use
+parsers = lazy_module('pdf2image.parsers')
+PDF2IMAGE_AVAILABLE = is_available('pdf2image')
+
+# Pages rendered per pdftoppm call; bounds peak memory during extraction
+RENDER_CHUNK_SIZE = int(os.environ.get('RENDER_CHUNK_SIZE', '4'))
+
+# Number of worker processes used to render page ranges in parallel
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', str(os.cpu_count() or 1)))
+
+# Longest side, in pixels, of the page thumbnails returned with preview=thumbnail
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', '256'))
+
+# Pixel budget of a full-resolution page render, in megapixels; pages too large
+# to fit at the maximum DPI are rendered at a lower DPI instead
+PAGE_PIXEL_BUDGET_MP = float(os.environ.get('PAGE_PIXEL_BUDGET_MP', '16'))
+
+MIN_DPI = 36
+
+def _poppler_input(pdf):
+    """
+    Command line argument and stdin data for a PDF path or in-memory buffer
+    """
+    if isinstance(pdf, str):
+        return pdf, None
+    return '-', getattr(pdf, 'data', pdf)
+
+def _run_poppler(args, stdin_data):
+    # The binary is looked up once per process, and a missing poppler fails
+    # without spawning anything
+    executable = poppler_path(args[0])
+    if executable is None:
+        raise RuntimeError(f"{args[0]} not found, poppler is not installed")
+    proc = subprocess.run([executable, *args[1:]], input=stdin_data, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{args[0]} failed: {proc.stderr.decode(errors='replace').strip()}")
+    return proc.stdout
+
+def get_page_count(pdf):
+    """
+    Get the number of pages in a PDF using pdfinfo
+
+    Args:
+        pdf: Path to the PDF file, or a PdfSource / bytes-like buffer that
+            is piped to pdfinfo over stdin
+    """
+    argument, stdin_data = _poppler_input(pdf)
+    for line in _run_poppler(['pdfinfo', argument], stdin_data).decode(errors='replace').splitlines():
+        key, _, value = line.partition(':')
+        if key.strip() == 'Pages':
+            return int(value)
+    raise RuntimeError("pdfinfo did not report a page count")
+
+def choose_dpi(width_pt, height_pt, max_dpi, pixel_budget_mp=None):
+    """
+    Highest DPI, up to max_dpi, at which a page stays within the pixel budget
+
+    Args:
+        width_pt (float): Page width in points
+        height_pt (float): Page height in points
+        max_dpi (int): Resolution used for pages that fit the budget
+        pixel_budget_mp (float): Budget in megapixels, PAGE_PIXEL_BUDGET_MP by default
+    """
+    budget = (pixel_budget_mp or PAGE_PIXEL_BUDGET_MP) * 1000000
+    area = max(width_pt * height_pt, 1.0)
+    return max(MIN_DPI, min(max_dpi, int(72 * math.sqrt(budget / area))))
+
+def convert_page_range(pdf, first_page, last_page, dpi, scale_to=None):
+    """
+    Render a page range with pdftoppm, returning a list of PIL images
+
+    In-memory PDFs are piped to pdftoppm over stdin and the pages are read
+    back from its stdout, so nothing is written to disk. With ``scale_to``
+    each page is scaled so its longest side is that many pixels, ignoring dpi.
+    """
+    argument, stdin_data = _poppler_input(pdf)
+    if scale_to:
+        resolution = ['-scale-to', str(scale_to)]
+    else:
+        resolution = ['-r', str(dpi)]
+    output = _run_poppler(
+        ['pdftoppm', *resolution, '-f', str(first_page), '-l', str(last_page), argument],
+        stdin_data
+    )
+    return parsers.parse_buffer_to_ppm(output)
+
+def split_page_ranges(page_count, chunk_size):
+    """
+    Split pages 1..page_count into (first_page, last_page) ranges of chunk_size
+    """
+    chunk_size = max(1, chunk_size)
+    return [
+        (first_page, min(first_page + chunk_size - 1, page_count))
+        for first_page in range(1, page_count + 1, chunk_size)
+    ]
+
+def split_page_list(pages, chunk_size):
+    """
+    Split sorted page numbers into (first_page, last_page) ranges of
+    consecutive pages, each at most chunk_size long
+    """
+    chunk_size = max(1, chunk_size)
+    ranges = []
+    for page in pages:
+        if ranges and page == ranges[-1][1] + 1 and page - ranges[-1][0] < chunk_size:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
+def iter_page_images(pdf, dpi=200, chunk_size=None):
+    """
+    Render PDF pages in bounded chunks, yielding (page_number, image) pairs
+
+    Only ``chunk_size`` rendered pages are held in memory at once, so peak
+    memory depends on the chunk size rather than the page count.
+
+    Args:
+        pdf: Path to the PDF file, or a PdfSource / bytes-like buffer
+        dpi (int): Render resolution
+        chunk_size (int): Number of pages rendered per pdftoppm call
+    """
+    for first_page, last_page in split_page_ranges(get_page_count(pdf), chunk_size or RENDER_CHUNK_SIZE):
+        yield from _iter_range(pdf, first_page, last_page, dpi)
+
+def _iter_range(pdf, first_page, last_page, dpi, scale_to=None):
+    with stage_timer('render'):
+        pages = convert_page_range(pdf, first_page, last_page, dpi, scale_to)
+    page_num = first_page
+    if not scale_to:
+        # PPM output carries no resolution; record it for image analytics
+        for page in pages:
+            page.info['dpi'] = (dpi, dpi)
+    while pages:
+        # Drop our reference before yielding so each page can be freed
+        # as soon as the consumer is done with it
+        yield page_num, pages.pop(0)
+        page_num += 1
+
+def render_page_range(pdf, first_page, last_page, dpi, info_fn, scale_to=None):
+    """
+    Render and encode one page range; runs inside a worker process
+
+    Args:
+        pdf: Path to the PDF file, or a PdfSource / bytes-like buffer that is
+            piped to pdftoppm
+        first_page (int): First page of the range (1-based, inclusive)
+        last_page (int): Last page of the range (inclusive)
+        dpi (int): Render resolution
+        info_fn: Module-level function taking (image, filename) and returning
+            an image info dict, e.g. ``get_image_info_from_pil``
+        scale_to (int): Render thumbnails of this size instead, see
+            convert_page_range
+
+    Returns (results, stages) where stages holds the time spent per stage,
+    since a worker process cannot record into the parent's metrics.
+    """
+    results = []
+    with capture_stages() as stages:
+        for page_num, page in _iter_range(pdf, first_page, last_page, dpi, scale_to):
+            image_info = info_fn(page, f"page_{page_num}.png")
+            page.close()
+            if image_info:
+                image_info['page'] = page_num
+                results.append(image_info)
+    return results, stages
+
+def render_shared_range(shared_name, size, first_page, last_page, dpi, info_fn, scale_to=None):
+    """
+    render_page_range for a PDF held in shared memory; runs inside a worker process
+
+    The document is piped to pdftoppm straight from the shared block, so the
+    worker neither receives its own copy of the PDF nor reads it from disk.
+
+    Args:
+        shared_name (str): Name of the SharedMemory block holding the PDF
+        size (int): Length of the PDF; the block may be rounded up
+        Other args are as for render_page_range.
+    """
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        view = shared.buf[:size]
+        try:
+            return render_page_range(view, first_page, last_page, dpi, info_fn, scale_to)
+        finally:
+            view.release()
+    finally:
+        shared.close()
+
+class RenderEngine:
+    """
+    Renders and encodes PDF page ranges in a pool of worker processes
+
+    Results are yielded in page order. At most ``2 * workers`` ranges are in
+    flight at once, so memory stays bounded for long documents. With a single
+    worker, or where process pools are unavailable, rendering happens in the
+    calling process, straight from the in-memory PDF.
+    """
+
+    def __init__(self, workers=None, chunk_size=None):
+        self.workers = max(1, workers or RENDER_WORKERS)
+        self.chunk_size = max(1, chunk_size or RENDER_CHUNK_SIZE)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Batch and job threads may render at the same time; create one pool
+        with self._lock:
+            if self._executor is None and self.workers > 1:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                except (OSError, NotImplementedError) as e:
+                    # Some serverless sandboxes have no working semaphores
+                    print(f"Process pool unavailable, rendering serially: {e}")
+                    self.workers = 1
+            return self._executor
+
+    def render(self, pdf, dpi, info_fn, page_count=None, scale_to=None, pages=None):
+        """
+        Render every page of a PDF, yielding image info dicts in page order
+
+        Args:
+            pdf: PdfSource, or a path to the PDF file
+            dpi (int): Render resolution
+            info_fn: Picklable function taking (image, filename)
+            page_count (int): Number of pages, looked up with pdfinfo if omitted
+            scale_to (int): Render thumbnails with this longest side instead
+            pages (list): (first, last) page ranges to render, as returned by
+                parse_ranges; every page when omitted
+        """
+        if page_count is None:
+            page_count = get_page_count(pdf)
+        if pages is None:
+            ranges = split_page_ranges(page_count, self.chunk_size)
+        else:
+            ranges = split_page_list(expand_ranges(pages, 1, page_count), self.chunk_size)
+
+        executor = self._get_executor() if len(ranges) > 1 else None
+        if executor is None:
+            for first_page, last_page in ranges:
+                yield from self._collect(render_page_range(pdf, first_page, last_page, dpi, info_fn, scale_to))
+            return
+
+        # Worker processes open the document by path, or read it from one
+        # shared memory copy, rather than receiving a copy of the whole PDF
+        # with every range
+        shared = None
+        if isinstance(pdf, str):
+            render_fn = partial(render_page_range, pdf)
+        else:
+            size = len(pdf.data)
+            with stage_timer('shared_copy'):
+                shared = shared_memory.SharedMemory(create=True, size=max(1, size))
+                shared.buf[:size] = pdf.data
+            render_fn = partial(render_shared_range, shared.name, size)
+
+        pending = deque()
+        ranges = iter(ranges)
+        try:
+            for first_page, last_page in ranges:
+                pending.append(executor.submit(render_fn, first_page, last_page, dpi, info_fn, scale_to))
+                if len(pending) >= self.workers * 2:
+                    break
+
+            while pending:
+                result = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append(executor.submit(render_fn, *next_range, dpi, info_fn, scale_to))
+                yield from self._collect(result)
+        finally:
+            for future in pending:
+                future.cancel()
+            if shared is not None:
+                # Workers still rendering keep their mapping until they detach
+                shared.close()
+                shared.unlink()
+
+    def render_page(self, pdf, page_num, dpi, info_fn):
+        """
+        Render a single page in the calling process, returning its image info dict
+        """
+        results = self._collect(render_page_range(pdf, page_num, page_num, dpi, info_fn))
+        return results[0] if results else None
+
+    def _collect(self, result):
+        results, stages = result
+        record_stages(stages)
+        count('pages_rendered', len(results))
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+_engine = None
+
+def get_render_engine():
+    """
+    Get the render engine shared by every request in this process
+    """
+    global _engine
+    if _engine is None:
+        _engine = RenderEngine()
+    return _engine
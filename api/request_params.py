@@ -0,0 +1,80 @@
+TRUTHY_VALUES = ('1', 'true', 'yes', 'on')
+
+def get_param(request, name, default=None):
+    """
+    Read a request parameter from the query string or form data
+    """
+    value = request.args.get(name)
+    if value is None:
+        value = request.form.get(name)
+    return default if value in (None, '') else value
+
+def get_bool_param(request, name, default=False):
+    """
+    Read a boolean flag such as ?metadata_only=1 from the request
+    """
+    value = get_param(request, name)
+    if value is None:
+        return default
+    return value.lower() in TRUTHY_VALUES
+
+def parse_ranges(text):
+    """
+    Parse a selection such as "1-3,7,10-" into (first, last) pairs
+
+    ``last`` is None for open-ended ranges. Raises ValueError for malformed
+    selections.
+    """
+    ranges = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition('-')
+        try:
+            first = int(first)
+            last = (int(last) if last.strip() else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid range: {part}")
+        if first < 0 or (last is not None and last < first):
+            raise ValueError(f"Invalid range: {part}")
+        ranges.append((first, last))
+    if not ranges:
+        raise ValueError("Empty range selection")
+    return ranges
+
+def get_ranges_param(request, name):
+    """
+    Read a range selection such as ?pages=1-3,7 from the request, or None if absent
+    """
+    value = get_param(request, name)
+    return parse_ranges(value) if value is not None else None
+
+def expand_ranges(ranges, lowest, highest):
+    """
+    Sorted numbers between lowest and highest (inclusive) covered by parsed ranges
+    """
+    selected = set()
+    for first, last in ranges:
+        last = highest if last is None else min(last, highest)
+        selected.update(range(max(first, lowest), last + 1))
+    return sorted(selected)
+
+def select_indices(items, ranges):
+    """
+    Yield the items at the 0-based positions covered by parsed ranges
+
+    Stops consuming ``items`` after the last selected position, so an
+    extraction generator does no work past the images that were asked for.
+    """
+    last_index = None if any(last is None for _, last in ranges) else max(last for _, last in ranges)
+    try:
+        for index, item in enumerate(items):
+            if last_index is not None and index > last_index:
+                break
+            if any(first <= index and (last is None or index <= last) for first, last in ranges):
+                yield item
+    finally:
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# In-memory tier size limit, measured as serialized JSON bytes
+RESULT_CACHE_MAX_MB = float(os.environ.get('RESULT_CACHE_MAX_MB', '256'))
+
+# Optional on-disk tier; disabled unless a directory is configured
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR')
+RESULT_CACHE_DISK_MAX_MB = float(os.environ.get('RESULT_CACHE_DISK_MAX_MB', '1024'))
+
+def make_cache_key(pdf_bytes, **params):
+    """
+    Content-addressed key for a PDF and the parameters used to extract it
+
+    Args:
+        pdf_bytes (bytes): Raw PDF data
+        **params: Extraction parameters such as dpi, method and output format
+    """
+    return digest_cache_key(hashlib.sha256(pdf_bytes).hexdigest(), **params)
+
+def digest_cache_key(pdf_sha256, **params):
+    """
+    Cache key for a PDF whose SHA-256 is already known, e.g. a stored
+    document's id; the same key make_cache_key gives for the PDF's bytes
+
+    Args:
+        pdf_sha256 (str): Hex SHA-256 of the PDF
+        **params: Extraction parameters such as dpi, method and output format
+    """
+    digest = hashlib.sha256(pdf_sha256.encode('ascii'))
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Two-tier LRU cache of per-image extraction results
+
+    The memory tier holds up to ``max_bytes`` of results. When ``disk_dir`` is
+    set, results are also written there as JSON files and the least recently
+    used files are deleted once the directory grows past ``disk_max_bytes``.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """
+        Return the cached images for a key, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        images = self._read_disk(key)
+        with self._lock:
+            if images is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self._put_memory(key, images, len(json.dumps(images)))
+        return images
+
+    def put(self, key, images):
+        """
+        Store the images extracted for a key in every configured tier
+        """
+        payload = json.dumps(images)
+        self._put_memory(key, images, len(payload))
+        self._write_disk(key, payload)
+
+    def _put_memory(self, key, images, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (images, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                images = json.load(f)
+            # Refresh the timestamp so eviction treats this entry as recent
+            os.utime(path)
+            return images
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, payload):
+        if not self.disk_dir:
+            return
+        try:
+            temp_path = self._disk_path(key) + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(temp_path, self._disk_path(key))
+            self._evict_disk()
+        except OSError as e:
+            print(f"Error writing result cache entry: {e}")
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.disk_dir, name))
+                total -= size
+            except OSError:
+                continue
+
+    def stats(self):
+        """
+        Hit/miss counters and current size, reported by /health
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+_cache = None
+
+def get_result_cache():
+    """
+    Get the result cache shared by every request in this process
+    """
+    global _cache
+    if _cache is None:
+        _cache = ResultCache(
+            max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+            disk_dir=RESULT_CACHE_DIR,
+            disk_max_bytes=int(RESULT_CACHE_DISK_MAX_MB * 1024 * 1024)
+        )
+    return _cache
@@ -0,0 +1,771 @@
+from flask import Blueprint, Flask, current_app, request, jsonify
+from flask_cors import CORS
+import io
+import base64
+import os
+from functools import partial
+from math import gcd
+
+import admission
+from admission import RETRY_AFTER_SECONDS, AdmissionError, admit_request, estimate_cost, get_admission_controller
+from analytics import NUMPY_AVAILABLE, DuplicateFinder, analyze_pixels
+from archive import stream_zip_response
+import capabilities
+from capabilities import is_available, lazy_module
+from batch import get_batch_runner, iter_batch_files, stream_batch_response
+from documents import get_document_store, thumbnail_fields
+from embedded import iter_embedded_images, select_images
+from encoders import ImageEncoder, encoder_from_request, output_filename
+from extractors import EXTRACTION_METHODS, available_backends, choose_render_backend, get_render_backend, plan_extraction
+import ingest
+from ingest import PdfSource, as_pdf_source, open_pdf_upload
+from jobs import JobQueueFull, get_job_manager
+import metrics
+from metrics import stage_timer
+from pdf_metadata import get_image_metadata, iter_pdf_metadata
+from rendering import THUMBNAIL_SIZE
+from request_params import get_bool_param, get_param, get_ranges_param
+from result_cache import digest_cache_key, get_result_cache, make_cache_key
+from streaming import STREAM_FORMATS, get_stream_format, stream_images_response
+
+# PIL, PyPDF2, pdf2image and NumPy are imported on first use, so cold starts
+# only pay for the libraries a request needs; whether they are installed is
+# checked without importing them
+Image = lazy_module('PIL.Image')
+PIL_AVAILABLE = is_available('PIL')
+PYPDF2_AVAILABLE = is_available('PyPDF2')
+PDF2IMAGE_AVAILABLE = is_available('pdf2image')
+
+# Routes shared by app.py and app_safe.py, registered on each app by create_app
+api = Blueprint('api', __name__)
+
+# Resolution pages are rendered at unless create_app is given another
+DEFAULT_DPI = 200
+
+# Values accepted by the `method` parameter of the page route
+PAGE_METHODS = ('render', 'embedded')
+
+# Values accepted by the `output` parameter of /extract-images
+OUTPUT_FORMATS = ('json', 'zip')
+
+# Values accepted by the `preview` parameter of /extract-images
+PREVIEW_TIERS = ('full', 'thumbnail')
+
+def get_image_info_from_pil(img, filename, encoding='base64', encoder=None, original=None, analytics=False,
+                            duplicate_sample=False):
+    """
+    Get comprehensive information about a PIL Image object
+    
+    Args:
+        img (PIL.Image): PIL Image object
+        filename (str): Name of the image file
+        encoding (str): 'base64' to embed the encoded image as a base64
+            string, or 'raw' to return the encoded bytes under 'data'
+        encoder (ImageEncoder): Output encoder, the configured default if omitted
+        original (bytes): Bytes the image was opened from, for encoder 'original'
+        analytics (bool): Add pixel statistics under 'analytics', see
+            analyze_pixels (None when NumPy is not installed)
+        duplicate_sample (bool): Keep the sample a DuplicateFinder compares,
+            see analyze_pixels
+    """
+    try:
+        # Get basic info
+        width, height = img.size
+        mode = img.mode
+        
+        # Encode with the selected encoder, which converts the colour mode
+        # only when the output format needs it
+        with stage_timer('encode'):
+            img_bytes, format_type = (encoder or ImageEncoder()).encode(img, original)
+        # Read the size and contents through the buffer without copying it
+        file_size = img_bytes.getbuffer().nbytes
+        
+        # Calculate aspect ratio
+        aspect_gcd = gcd(width, height)
+        aspect_ratio = f"{width//aspect_gcd}:{height//aspect_gcd}"
+        
+        image_info = {
+            'filename': output_filename(filename, format_type),
+            'width': width,
+            'height': height,
+            'format': format_type,
+            'mode': mode,
+            'file_size': file_size,
+            'aspect_ratio': aspect_ratio
+        }
+        
+        # After encoding, since analysis may reduce a JPEG that was never decoded
+        if analytics:
+            image_info['analytics'] = analyze_pixels(img, duplicate_sample)
+        
+        if encoding == 'raw':
+            image_info['data'] = img_bytes.getvalue()
+        else:
+            # Convert to base64 for frontend display
+            with stage_timer('base64'):
+                image_info['base64'] = base64.b64encode(img_bytes.getbuffer()).decode('utf-8')
+        
+        return image_info
+        
+    except Exception as e:
+        print(f"Error processing image {filename}: {e}")
+        return None
+
+def get_thumbnail_info_from_pil(img, filename, encoding='base64', encoder=None, analytics=False,
+                                duplicate_sample=False):
+    """
+    Shrink an image to a THUMBNAIL_SIZE preview and describe it
+    
+    PIL's thumbnail() uses draft() and reduce(), so large JPEGs are scaled
+    while decoding instead of being decoded at full size first.
+    """
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), reducing_gap=2.0)
+    return get_image_info_from_pil(img, filename, encoding, encoder, analytics=analytics,
+                                   duplicate_sample=duplicate_sample)
+
+def iter_images_from_pdf(pdf_file, method='render', encoding='base64', preview='full', document_id=None,
+                         encoder=None, pages=None, analytics=False, strict=False, dpi=DEFAULT_DPI):
+    """
+    Extract images from PDF file, yielding each image as soon as it is encoded
+    
+    Args:
+        pdf_file: PdfSource, or a file object containing PDF data
+        method (str): 'render' to rasterize pages (falling back to embedded
+            images), 'embedded' to return only the embedded images, or
+            'auto' to return scanned pages as stored and render the rest;
+            see plan_extraction
+        encoding (str): 'base64' or 'raw', see get_image_info_from_pil
+        preview (str): 'full', or 'thumbnail' for small page previews whose
+            full-resolution render can be fetched later by document id
+        document_id (str): Document store id reported with thumbnails; None
+            if the PDF could not be kept
+        encoder (ImageEncoder): Encoder for rendered and decoded images;
+            'original' returns every embedded image as stored instead, see
+            iter_embedded_images
+        pages (list): (first, last) page ranges to extract, as returned by
+            parse_ranges; every page when omitted
+        analytics (bool): Add pixel statistics to every image and flag near
+            duplicates of earlier images
+        strict (bool): Raise extraction errors instead of logging them and
+            ending early, so a PDF that cannot be read fails rather than
+            yielding no images
+        dpi (int): Resolution pages are rendered at
+    """
+    if not PIL_AVAILABLE:
+        return
+    
+    thumbnails = preview == 'thumbnail'
+    # Every analyzed image is flagged by duplicates below, which removes its sample
+    if thumbnails:
+        info_fn = partial(get_thumbnail_info_from_pil, encoding=encoding, encoder=encoder, analytics=analytics,
+                          duplicate_sample=analytics)
+    else:
+        info_fn = partial(get_image_info_from_pil, encoding=encoding, encoder=encoder, analytics=analytics,
+                          duplicate_sample=analytics)
+    # Embedded images that are not complete files (e.g. FlateDecode) are
+    # only decoded and encoded as PNG when another encoder is asked for
+    convert = (encoder or ImageEncoder()).name != 'original'
+    duplicates = DuplicateFinder()
+    # The PDF is read once and every backend works from the same buffer
+    source = as_pdf_source(pdf_file)
+    
+    try:
+        # A cheap scan of the page tree picks the backends before any page is
+        # rendered or decoded
+        plan = plan_extraction(source, method, pages=pages, thumbnails=thumbnails)
+        images = plan.run(source, info_fn, dpi=dpi, encoding=encoding,
+                          analyze_fn=partial(analyze_pixels, duplicate_sample=True) if analytics else None,
+                          scale_to=THUMBNAIL_SIZE if thumbnails else None, strict=strict, convert=convert)
+        for image_info in images:
+            if thumbnails:
+                # Page sizes give the DPI each page's full-resolution render will use
+                image_info.update(thumbnail_fields(document_id, plan.scan['page_sizes'], image_info['page'], dpi))
+            yield duplicates.flag(image_info)
+        
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error processing PDF: {e}")
+    finally:
+        if source is not pdf_file:
+            source.close()
+
+def extract_images_from_pdf(pdf_file, method='render', dpi=DEFAULT_DPI):
+    """
+    Extract images from PDF file
+    
+    Args:
+        pdf_file: PdfSource, or a file object containing PDF data
+        method (str): 'render', 'embedded' or 'auto', see iter_images_from_pdf
+        dpi (int): Resolution pages are rendered at
+    """
+    return list(iter_images_from_pdf(pdf_file, method, dpi=dpi))
+
+def missing_dependency_response(pdf=False, metadata=False, render=False):
+    """
+    Error response naming a library the request needs but that is not
+    installed, or None; only apps created with check_dependencies check
+    
+    Args:
+        pdf (bool): The request reads PDFs with an extraction backend
+        metadata (bool): The request reads PDF structure with PyPDF2
+        render (bool): The request renders a page
+    """
+    if not current_app.config['CHECK_DEPENDENCIES']:
+        return None
+    if not PIL_AVAILABLE:
+        error = 'PIL/Pillow not installed. Please install with: pip install Pillow'
+    elif pdf and not available_backends():
+        error = 'No PDF processing library available. Please install pdf2image or PyPDF2'
+    elif metadata and not PYPDF2_AVAILABLE:
+        error = 'PyPDF2 not installed. Please install with: pip install PyPDF2'
+    elif render and choose_render_backend(1) is None:
+        error = 'No render backend installed. Please install pdf2image and poppler, pypdfium2 or PyMuPDF'
+    else:
+        return None
+    return jsonify({'error': error}), 500
+
+@api.route('/health', methods=['GET'])
+def health_check():
+    status = {
+        'status': 'healthy',
+        'message': 'PDF Image Size Detector API is running',
+        'extraction_backends': available_backends(),
+        'admission': get_admission_controller().stats(),
+        'cache': get_result_cache().stats(),
+        'capabilities': capabilities.report()
+    }
+    if current_app.config['CHECK_DEPENDENCIES']:
+        status['dependencies'] = {
+            'PIL': PIL_AVAILABLE,
+            'PyPDF2': PYPDF2_AVAILABLE,
+            'pdf2image': PDF2IMAGE_AVAILABLE,
+            'numpy': NUMPY_AVAILABLE
+        }
+    return jsonify(status)
+
+@api.route('/extract-images', methods=['POST'])
+def extract_images():
+    try:
+        error = missing_dependency_response(pdf=True)
+        if error:
+            return error
+        
+        # Check if PDF file is provided
+        if 'pdf' not in request.files:
+            return jsonify({'error': 'No PDF file provided'}), 400
+        
+        pdf_file = request.files['pdf']
+        
+        if pdf_file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not pdf_file.filename.lower().endswith('.pdf'):
+            return jsonify({'error': 'File must be a PDF'}), 400
+        
+        method = get_param(request, 'method', 'render').lower()
+        if method not in EXTRACTION_METHODS:
+            return jsonify({'error': f'Unsupported extraction method: {method}'}), 400
+        
+        output = get_param(request, 'output', 'json').lower()
+        if output not in OUTPUT_FORMATS:
+            return jsonify({'error': f'Unsupported output format: {output}'}), 400
+        
+        # Opt-in streaming: emit each image as soon as it is encoded
+        stream_format = get_stream_format(request)
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return jsonify({'error': f'Unsupported stream format: {stream_format}'}), 400
+        
+        try:
+            encoder = encoder_from_request(request)
+            # Page ranges (1-based) and image positions (0-based) to return,
+            # e.g. pages=1-3,7 and images=0-4
+            pages = get_ranges_param(request, 'pages')
+            image_indices = get_ranges_param(request, 'images')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Metadata-only mode reads sizes from the PDF structure without
+        # rendering, decoding or encoding any image
+        metadata_only = get_bool_param(request, 'metadata_only')
+        if metadata_only:
+            error = missing_dependency_response(metadata=True)
+            if error:
+                return error
+        
+        # Pixel statistics (blank pages, colour class, dominant colours, near
+        # duplicates) need decoded images
+        analytics = get_bool_param(request, 'analytics')
+        if analytics and metadata_only:
+            return jsonify({'error': 'Analytics cannot be combined with metadata_only'}), 400
+        
+        # Thumbnail previews: small page renders now, full-resolution pages
+        # on demand from /documents/<document_id>/pages/<n>
+        preview = get_param(request, 'preview', 'full').lower()
+        if preview not in PREVIEW_TIERS:
+            return jsonify({'error': f'Unsupported preview tier: {preview}'}), 400
+        if preview == 'thumbnail' and (method != 'render' or metadata_only):
+            return jsonify({'error': 'Thumbnail previews are only available for rendered pages'}), 400
+        
+        dpi = current_app.config['RENDER_DPI']
+        
+        # Read the upload once; it is released when the request (or its
+        # streamed response) ends
+        source = open_pdf_upload(pdf_file)
+        
+        # Repeat uploads of the same PDF with the same parameters are served
+        # from the result cache instead of being extracted again
+        cache = get_result_cache()
+        cache_key = make_cache_key(
+            source.data,
+            method='metadata' if metadata_only else method,
+            dpi=dpi,
+            output_format=encoder.cache_label,
+            preview=preview,
+            pages=get_param(request, 'pages'),
+            images=get_param(request, 'images'),
+            analytics=analytics
+        )
+        cached_images = cache.get(cache_key) if output == 'json' else None
+        
+        # Documents over the page or pixel budget are turned away before any
+        # work starts, and heavy extractions wait for a free slot
+        if cached_images is None and not metadata_only:
+            try:
+                admit_request(source, method, dpi=dpi, pages=pages, thumbnails=preview == 'thumbnail')
+            except AdmissionError as e:
+                return e.response()
+        
+        document_id = get_document_store().put(source.data) if preview == 'thumbnail' else None
+        
+        # Binary download: image files are written straight into a streamed
+        # ZIP archive instead of being base64 encoded into JSON
+        if output == 'zip':
+            if metadata_only:
+                images = iter_pdf_metadata(source, dpi=dpi, pages=pages)
+            else:
+                images = iter_images_from_pdf(source, method, encoding='raw', preview=preview,
+                                              document_id=document_id, encoder=encoder, pages=pages,
+                                              analytics=analytics, dpi=dpi)
+            if image_indices is not None:
+                images = select_images(images, image_indices)
+            return stream_zip_response(images, pdf_file.filename)
+        
+        if cached_images is not None:
+            images = iter(cached_images)
+        else:
+            if metadata_only:
+                images = iter_pdf_metadata(source, dpi=dpi, pages=pages)
+            else:
+                images = iter_images_from_pdf(source, method, preview=preview, document_id=document_id,
+                                              encoder=encoder, pages=pages, analytics=analytics, dpi=dpi)
+            if image_indices is not None:
+                images = select_images(images, image_indices)
+        
+        if stream_format:
+            return stream_images_response(images, stream_format)
+        
+        # Extract images from PDF
+        images = list(images)
+        if cached_images is None and images:
+            cache.put(cache_key, images)
+        
+        return jsonify({
+            'success': True,
+            'message': f'Successfully extracted {len(images)} images',
+            'images': images,
+            'total_images': len(images)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing PDF: {str(e)}'
+        }), 500
+
+@api.route('/documents', methods=['POST'])
+def create_document():
+    """
+    Store a PDF for page-at-a-time access and return its document id
+    """
+    try:
+        if 'pdf' not in request.files:
+            return jsonify({'error': 'No PDF file provided'}), 400
+        
+        pdf_file = request.files['pdf']
+        
+        if pdf_file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not pdf_file.filename.lower().endswith('.pdf'):
+            return jsonify({'error': 'File must be a PDF'}), 400
+        
+        source = open_pdf_upload(pdf_file)
+        store = get_document_store()
+        document_id = store.put(source.data)
+        if document_id is None:
+            return jsonify({'error': 'PDF is too large to keep for page access'}), 413
+        index = store.get_index(document_id)
+        if index is None:
+            return jsonify({'error': 'Document was evicted, upload it again'}), 503
+        
+        return jsonify({
+            'success': True,
+            'document_id': document_id,
+            'page_count': index.page_count
+        }), 201
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing PDF: {str(e)}'
+        }), 500
+
+@api.route('/documents/<document_id>/pages/<int:page_num>', methods=['GET'])
+def get_document_page(document_id, page_num):
+    """
+    Render or extract one page of a stored PDF on demand
+    
+    Documents stored with POST /documents (or a preview=thumbnail upload) are
+    parsed once and kept with their page index, so each request only pays
+    for its own page. method=render renders the page at full resolution, at
+    a DPI chosen from the page size so very large pages stay within the
+    pixel budget; method=embedded returns the page's embedded images.
+    Results are kept in the result cache.
+    """
+    try:
+        error = missing_dependency_response()
+        if error:
+            return error
+        
+        method = get_param(request, 'method', 'render').lower()
+        if method not in PAGE_METHODS:
+            return jsonify({'error': f'Unsupported extraction method: {method}'}), 400
+        
+        try:
+            encoder = encoder_from_request(request)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        analytics = get_bool_param(request, 'analytics')
+        
+        index = get_document_store().get_index(document_id)
+        if index is None:
+            return jsonify({'error': 'Document not found, upload it again'}), 404
+        
+        dpi = index.page_dpi(page_num, current_app.config['RENDER_DPI'])
+        if dpi is None:
+            return jsonify({'error': 'Page not found'}), 404
+        
+        cache = get_result_cache()
+        cache_key = digest_cache_key(document_id, method=f'page-{method}', page=page_num, dpi=dpi,
+                                     output_format=encoder.cache_label, analytics=analytics)
+        images = cache.get(cache_key)
+        
+        if images is None:
+            info_fn = partial(get_image_info_from_pil, encoder=encoder, analytics=analytics)
+            if method == 'embedded':
+                if index.reader is None:
+                    return jsonify({'error': 'Embedded images are not available for this document'}), 500
+                # Only the requested page's objects are parsed
+                with index.lock:
+                    images = list(iter_embedded_images(index.reader, info_fn, convert=encoder.name != 'original',
+                                                       pages=[(page_num, page_num)],
+                                                       analyze_fn=analyze_pixels if analytics else None))
+            else:
+                error = missing_dependency_response(render=True)
+                if error:
+                    return error
+                image_info = get_render_backend(1).render_page(index.source, page_num, dpi, info_fn)
+                if image_info is None:
+                    return jsonify({'error': 'Failed to render page'}), 500
+                image_info.update(tier='full', document_id=document_id, dpi=dpi)
+                images = [image_info]
+            cache.put(cache_key, images)
+        
+        if method == 'embedded':
+            return jsonify({
+                'success': True,
+                'message': f'Successfully extracted {len(images)} images',
+                'images': images,
+                'total_images': len(images)
+            })
+        return jsonify({
+            'success': True,
+            'image': images[0]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing page: {str(e)}'
+        }), 500
+
+@api.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Queue a PDF for background extraction, for documents that would not
+    finish within the request timeout
+    """
+    try:
+        error = missing_dependency_response(pdf=True)
+        if error:
+            return error
+        
+        if 'pdf' not in request.files:
+            return jsonify({'error': 'No PDF file provided'}), 400
+        
+        pdf_file = request.files['pdf']
+        
+        if pdf_file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not pdf_file.filename.lower().endswith('.pdf'):
+            return jsonify({'error': 'File must be a PDF'}), 400
+        
+        method = get_param(request, 'method', 'render').lower()
+        if method not in EXTRACTION_METHODS:
+            return jsonify({'error': f'Unsupported extraction method: {method}'}), 400
+        
+        try:
+            encoder = encoder_from_request(request)
+            pages = get_ranges_param(request, 'pages')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        dpi = current_app.config['RENDER_DPI']
+        if get_bool_param(request, 'metadata_only'):
+            extract_fn = partial(iter_pdf_metadata, dpi=dpi, pages=pages)
+        else:
+            # Errors are raised so the job is reported as failed
+            extract_fn = partial(iter_images_from_pdf, method=method, encoder=encoder, pages=pages,
+                                 analytics=get_bool_param(request, 'analytics'), strict=True, dpi=dpi)
+        
+        try:
+            job_id = get_job_manager().submit(pdf_file.read(), extract_fn, pages=pages)
+        except JobQueueFull as e:
+            return jsonify({'success': False, 'error': str(e)}), 429, {'Retry-After': str(RETRY_AFTER_SECONDS)}
+        job = get_job_manager().get(job_id)
+        job.pop('images', None)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'job': job
+        }), 202
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error queueing PDF: {str(e)}'
+        }), 500
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Report a job's progress, and its images once it has finished
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    images = job.pop('images', None)
+    response = {
+        'success': job['status'] != 'failed',
+        'job': job
+    }
+    if job['status'] == 'done':
+        response['message'] = f'Successfully extracted {len(images)} images'
+        response['images'] = images
+        response['total_images'] = len(images)
+    
+    return jsonify(response)
+
+def process_batch_file(entry, method='render', encoder=None, image_encoder=None, pages=None,
+                       pages_param=None, metadata_only=False, analytics=False, dpi=DEFAULT_DPI):
+    """
+    Extract the images of one batch file, returning its result fields
+
+    PDFs share the result cache with /extract-images; images are analyzed
+    as by /analyze-image.
+
+    Args:
+        entry (dict): Batch entry from iter_batch_files
+        method (str): 'render', 'embedded' or 'auto', see iter_images_from_pdf
+        encoder (ImageEncoder): Encoder for images extracted from PDFs
+        image_encoder (ImageEncoder): Encoder for uploaded images
+        pages (list): (first, last) page ranges to extract from PDFs
+        pages_param (str): The `pages` parameter as sent, for the cache key
+        metadata_only (bool): Read sizes without decoding or encoding images
+        analytics (bool): Add pixel statistics, see get_image_info_from_pil
+        dpi (int): Resolution pages are rendered at
+    """
+    data = entry['data']
+    if entry['kind'] == 'image':
+        try:
+            img = Image.open(io.BytesIO(data))
+        except Image.UnidentifiedImageError:
+            # PIL's message names the BytesIO object rather than the file
+            raise ValueError(f"Cannot identify image file {entry['filename']}")
+        if metadata_only:
+            image_info = get_image_metadata(img, entry['filename'], len(data))
+        else:
+            image_info = get_image_info_from_pil(img, entry['filename'], encoder=image_encoder, original=data,
+                                                 analytics=analytics)
+        if not image_info:
+            raise ValueError('Failed to analyze image')
+        return {'images': [image_info], 'total_images': 1}
+
+    cache = get_result_cache()
+    cache_key = make_cache_key(
+        data,
+        method='metadata' if metadata_only else method,
+        dpi=dpi,
+        output_format=encoder.cache_label,
+        preview='full',
+        pages=pages_param,
+        images=None,
+        analytics=analytics
+    )
+    images = cache.get(cache_key)
+    if images is None:
+        source = PdfSource(data)
+        try:
+            if metadata_only:
+                images = list(iter_pdf_metadata(source, dpi=dpi, pages=pages))
+            else:
+                # Files over the budget fail on their own; heavy ones wait for
+                # a slot shared with /extract-images
+                cost = estimate_cost(source, method, dpi=dpi, pages=pages)
+                with get_admission_controller().admit(cost, blocking=True):
+                    # A PDF that cannot be read fails this file instead of yielding nothing
+                    images = list(iter_images_from_pdf(source, method, encoder=encoder, pages=pages,
+                                                       analytics=analytics, strict=True, dpi=dpi))
+        finally:
+            source.close()
+        if images:
+            cache.put(cache_key, images)
+    return {'images': images, 'total_images': len(images)}
+
+@api.route('/batch', methods=['POST'])
+def batch_extract():
+    """
+    Extract images from many PDFs and images in one request
+
+    Files may be uploaded under any field name, and ZIP or tar archives are
+    expanded. Files are processed in parallel and one record per file is
+    streamed back as it finishes; a file that fails does not stop the others.
+    """
+    try:
+        error = missing_dependency_response(pdf=True)
+        if error:
+            return error
+        
+        uploads = [upload for _, upload in request.files.items(multi=True) if upload.filename]
+        if not uploads:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        method = get_param(request, 'method', 'render').lower()
+        if method not in EXTRACTION_METHODS:
+            return jsonify({'error': f'Unsupported extraction method: {method}'}), 400
+        
+        stream_format = get_param(request, 'stream', 'ndjson').lower()
+        if stream_format not in STREAM_FORMATS:
+            return jsonify({'error': f'Unsupported stream format: {stream_format}'}), 400
+        
+        try:
+            encoder = encoder_from_request(request)
+            image_encoder = encoder_from_request(request, default='original')
+            pages = get_ranges_param(request, 'pages')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        process_fn = partial(
+            process_batch_file,
+            method=method,
+            encoder=encoder,
+            image_encoder=image_encoder,
+            pages=pages,
+            pages_param=get_param(request, 'pages'),
+            metadata_only=get_bool_param(request, 'metadata_only'),
+            analytics=get_bool_param(request, 'analytics'),
+            dpi=current_app.config['RENDER_DPI']
+        )
+        records = get_batch_runner().run(iter_batch_files(uploads), process_fn)
+        return stream_batch_response(records, stream_format)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing batch: {str(e)}'
+        }), 500
+
+@api.route('/analyze-image', methods=['POST'])
+def analyze_image():
+    """
+    Analyze a single uploaded image
+    """
+    try:
+        error = missing_dependency_response()
+        if error:
+            return error
+        
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image file provided'}), 400
+        
+        image_file = request.files['image']
+        
+        if image_file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        # Open and analyze the image
+        if get_bool_param(request, 'metadata_only'):
+            # Image.open only parses the header; skip decoding and re-encoding
+            img = Image.open(image_file)
+            image_file.seek(0, os.SEEK_END)
+            image_info = get_image_metadata(img, image_file.filename, image_file.tell())
+        else:
+            # Uploaded images are returned as their original bytes unless
+            # another encoder is requested
+            try:
+                encoder = encoder_from_request(request, default='original')
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            original = image_file.read()
+            img = Image.open(io.BytesIO(original))
+            image_info = get_image_info_from_pil(img, image_file.filename, encoder=encoder, original=original,
+                                                 analytics=get_bool_param(request, 'analytics'))
+        
+        if image_info:
+            return jsonify({
+                'success': True,
+                'image': image_info
+            })
+        else:
+            return jsonify({'error': 'Failed to analyze image'}), 500
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error analyzing image: {str(e)}'
+        }), 500
+
+def create_app(dpi=DEFAULT_DPI, check_dependencies=False):
+    """
+    Create the API app
+    
+    Args:
+        dpi (int): Resolution pages are rendered at
+        check_dependencies (bool): Answer requests that need a library that
+            is not installed with an error naming it, and list the
+            libraries under 'dependencies' in /health
+    """
+    app = Flask(__name__)
+    app.config['RENDER_DPI'] = dpi
+    app.config['CHECK_DEPENDENCIES'] = check_dependencies
+    CORS(app)
+    metrics.init_app(app)
+    ingest.init_app(app)
+    admission.init_app(app)
+    app.register_blueprint(api)
+    return app
@@ -0,0 +1,92 @@
+import json
+
+from flask import Response, stream_with_context
+
+from request_params import get_param
+
+# Supported values of the `stream` request parameter and their content types
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+def get_stream_format(request):
+    """
+    Read the opt-in `stream` parameter from the query string or form data
+
+    Returns None when the client asked for a regular JSON response.
+    """
+    stream_format = get_param(request, 'stream')
+    return stream_format.lower() if stream_format else None
+
+def format_record(record, stream_format):
+    """
+    Serialize a single record for the given stream format
+
+    Args:
+        record (dict): Record to send, must contain a 'type' key
+        stream_format (str): 'ndjson' or 'sse'
+    """
+    payload = json.dumps(record, separators=(',', ':'))
+    if stream_format == 'sse':
+        return f"event: {record['type']}\ndata: {payload}\n\n"
+    return payload + '\n'
+
+def stream_images_response(images, stream_format):
+    """
+    Build a streaming response that emits one record per extracted image
+
+    Each image is sent as soon as the `images` iterator produces it, followed by
+    a final 'summary' record carrying the totals (or an 'error' record if
+    extraction failed part way through).
+
+    An embedded image's 'pages' list grows as later pages are read, so the
+    copy streamed with the image only lists the pages seen so far. The
+    summary's 'pages' maps the filename of every image with such a list to
+    its final pages.
+
+    Args:
+        images: Iterator of image info dicts
+        stream_format (str): 'ndjson' or 'sse'
+    """
+    def generate():
+        total_images = 0
+        pages = {}
+        try:
+            for image_info in images:
+                # Reference records share their original's list
+                if 'pages' in image_info and 'duplicate_of' not in image_info:
+                    pages[image_info['filename']] = image_info['pages']
+                yield format_record({
+                    'type': 'image',
+                    'index': total_images,
+                    'image': image_info
+                }, stream_format)
+                total_images += 1
+
+            summary = {
+                'type': 'summary',
+                'success': True,
+                'message': f'Successfully extracted {total_images} images',
+                'total_images': total_images
+            }
+            if pages:
+                summary['pages'] = pages
+            yield format_record(summary, stream_format)
+        except Exception as e:
+            yield format_record({
+                'type': 'error',
+                'success': False,
+                'error': f'Error processing PDF: {str(e)}',
+                'total_images': total_images
+            }, stream_format)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=STREAM_FORMATS[stream_format],
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies from buffering the whole response
+            'X-Accel-Buffering': 'no'
+        }
+    )
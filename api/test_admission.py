@@ -0,0 +1,43 @@
+import pytest
+
+from admission import (HEAVY_REQUEST_MEGAPIXELS, MAX_REQUEST_MEGAPIXELS, MAX_REQUEST_PAGES, AdmissionController,
+                       AdmissionError, estimate_cost)
+
+LIGHT = {'pages': 1, 'megapixels': 1.0}
+HEAVY = {'pages': 10, 'megapixels': HEAVY_REQUEST_MEGAPIXELS + 1}
+
+def test_estimate_cost(text_pdf):
+    # Letter pages at 72 DPI are 612 x 792 pixels
+    assert estimate_cost(text_pdf, dpi=72) == {'pages': 3, 'megapixels': 1.5}
+    assert estimate_cost(text_pdf, dpi=72, pages=[(2, None)])['pages'] == 2
+    assert estimate_cost(b'not a pdf') is None
+
+@pytest.mark.parametrize('cost', [
+    {'pages': MAX_REQUEST_PAGES + 1, 'megapixels': None},
+    {'pages': 1, 'megapixels': MAX_REQUEST_MEGAPIXELS + 1},
+])
+def test_requests_over_budget_get_413(cost):
+    with pytest.raises(AdmissionError) as error:
+        AdmissionController().admit(cost)
+    assert error.value.status == 413
+
+def test_light_requests_do_not_take_a_slot():
+    controller = AdmissionController(slots=1, queue_size=0, wait_seconds=0)
+    with controller.admit(HEAVY):
+        with controller.admit(LIGHT) as ticket:
+            assert not ticket.heavy
+
+def test_heavy_requests_over_capacity_get_429():
+    controller = AdmissionController(slots=1, queue_size=1, wait_seconds=0.01)
+    ticket = controller.admit(HEAVY)
+    # Unknown costs count as heavy
+    with pytest.raises(AdmissionError) as error:
+        controller.admit(None)
+    assert error.value.status == 429 and error.value.retry_after > 0
+    assert controller.stats() == {'slots': 1, 'running': 1, 'waiting': 0, 'rejected': 1}
+
+    ticket.release()
+    ticket.release()
+    with controller.admit(HEAVY):
+        assert controller.stats()['running'] == 1
+    assert controller.stats()['running'] == 0
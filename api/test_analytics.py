@@ -0,0 +1,56 @@
+import io
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+from PIL import Image, ImageDraw, ImageFont
+
+from analytics import DUPLICATE_SAMPLE_FIELD, DuplicateFinder, analyze_pixels
+
+WORDS = ['archive', 'invoice', 'total', 'page', 'report', 'quarter', 'signed', 'draft', 'copy', 'notes']
+
+def text_page(lines, seed):
+    rng = random.Random(seed)
+    img = Image.new('RGB', (425, 550), 'white')
+    draw = ImageDraw.Draw(img)
+    for line in range(lines):
+        draw.text((40, 40 + line * 18), ' '.join(rng.choice(WORDS) for _ in range(6)), fill='black',
+                  font=ImageFont.load_default())
+    # The bitmap font has a single size; scale the page up to a render-like size
+    return img.resize((850, 1100))
+
+def record(img, filename, fmt='PNG'):
+    # Round trip through the format, as a rendered or embedded image would be
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, quality=75)
+    return {'filename': filename, 'analytics': analyze_pixels(Image.open(buffer), duplicate_sample=True)}
+
+def test_blank_is_measured_against_white():
+    assert analyze_pixels(Image.new('RGB', (300, 400), 'white'))['blank']
+    red = analyze_pixels(Image.new('RGB', (300, 400), (200, 0, 0)))
+    assert not red['blank'] and red['ink_coverage'] == 1.0
+    assert red['dhash'] is None
+
+def test_different_text_pages_are_not_duplicates():
+    finder = DuplicateFinder()
+    # Pages of body text, then pages of one short line that hash alike
+    pages = [text_page(25, seed) for seed in range(4)] + [text_page(1, seed) for seed in range(4)]
+    flagged = [finder.flag(record(page, f"page_{n}.png"))['analytics']['near_duplicate_of']
+               for n, page in enumerate(pages, 1)]
+    assert flagged == [None] * len(pages)
+
+def test_rescan_is_flagged_as_duplicate():
+    finder = DuplicateFinder()
+    page = text_page(25, seed=1)
+    rescan = Image.new('RGB', page.size, 'white')
+    rescan.paste(page.resize((846, 1095)), (3, 2))
+    finder.flag(record(page, 'page_1.png'))
+    finder.flag(record(text_page(25, seed=2), 'page_2.png'))
+    assert finder.flag(record(rescan, 'page_3.jpg', 'JPEG'))['analytics']['near_duplicate_of'] == 'page_1.png'
+
+def test_flag_removes_the_duplicate_sample():
+    analyzed = record(text_page(25, seed=1), 'page_1.png')
+    assert DUPLICATE_SAMPLE_FIELD in analyzed['analytics']
+    assert DUPLICATE_SAMPLE_FIELD not in DuplicateFinder().flag(analyzed)['analytics']
+    assert DUPLICATE_SAMPLE_FIELD not in analyze_pixels(text_page(25, seed=1))
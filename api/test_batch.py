@@ -0,0 +1,37 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from app import app
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+def post_batch(client, files, **params):
+    response = client.post('/batch', query_string=params,
+                           data={name: (io.BytesIO(data), name) for name, data in files.items()})
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return {record.get('filename'): record for record in records}
+
+def test_broken_files_fail_on_their_own(client, pdf_builder):
+    pdf_builder.page(b"q 612 0 0 792 0 0 cm /Im0 Do Q", xobjects={'Im0': pdf_builder.jpeg()})
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zip_file:
+        zip_file.writestr('good.pdf', pdf_builder.build())
+        zip_file.writestr('bad.pdf', b'%PDF-1.4 truncated')
+        zip_file.writestr('bad.png', b'not an image')
+
+    records = post_batch(client, {'files.zip': archive.getvalue()}, method='embedded')
+
+    assert records['files.zip/good.pdf']['success']
+    assert records['files.zip/good.pdf']['total_images'] == 1
+    assert not records['files.zip/bad.pdf']['success']
+    assert records['files.zip/bad.png']['error'] == 'Error processing file: Cannot identify image file files.zip/bad.png'
+    assert records[None] == {
+        'type': 'summary', 'success': True, 'message': 'Processed 3 files',
+        'total_files': 3, 'files_failed': 2, 'total_images': 1
+    }
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from cli import Checkpoint, iter_pdf_files, run
+
+OPTIONS = {'method': 'embedded', 'encoder': None, 'quality': None, 'pages': None,
+           'metadata_only': False, 'analytics': False}
+
+@pytest.fixture
+def archive(tmp_path, pdf_builder):
+    pdf_builder.page(b"q 612 0 0 792 0 0 cm /Im0 Do Q", xobjects={'Im0': pdf_builder.jpeg()})
+    input_dir = tmp_path / 'archive'
+    (input_dir / '2019').mkdir(parents=True)
+    (input_dir / '2019' / 'report.pdf').write_bytes(pdf_builder.build())
+    (input_dir / 'bad.pdf').write_bytes(b'%PDF-1.4 truncated')
+    (input_dir / 'notes.txt').write_text('not a pdf')
+    return input_dir
+
+def test_iter_pdf_files_skips_output_dir(archive):
+    (archive / 'extracted').mkdir()
+    (archive / 'extracted' / 'copy.pdf').write_bytes(b'')
+    assert list(iter_pdf_files(str(archive), exclude_dir=str(archive / 'extracted'))) == [
+        'bad.pdf', os.path.join('2019', 'report.pdf')
+    ]
+
+def test_run_writes_images_and_manifest(archive, tmp_path):
+    output_dir = tmp_path / 'extracted'
+    summary = run(str(archive), str(output_dir), OPTIONS)
+    assert (summary['done'], summary['failed'], summary['images']) == (1, 1, 1)
+
+    manifest = json.loads((output_dir / '2019' / 'report.pdf' / 'manifest.json').read_text())
+    assert manifest['total_images'] == 1
+    assert (output_dir / '2019' / 'report.pdf' / manifest['images'][0]['file']).exists()
+    # Failed files leave no output behind
+    assert sorted(os.listdir(output_dir)) == ['2019', 'checkpoint.jsonl']
+
+def test_run_resumes_from_checkpoint(archive, tmp_path):
+    output_dir = str(tmp_path / 'extracted')
+    run(str(archive), output_dir, OPTIONS)
+
+    summary = run(str(archive), output_dir, OPTIONS)
+    assert (summary['skipped'], summary['done'], summary['failed']) == (2, 0, 0)
+
+    summary = run(str(archive), output_dir, OPTIONS, retry_failed=True)
+    assert (summary['skipped'], summary['failed']) == (1, 1)
+
+    # Changed files and changed options are extracted again
+    report = archive / '2019' / 'report.pdf'
+    os.utime(report, (0, 0))
+    assert run(str(archive), output_dir, OPTIONS)['done'] == 1
+    assert run(str(archive), output_dir, dict(OPTIONS, metadata_only=True))['done'] == 1
+
+def test_extracting_again_keeps_other_pdfs_output(archive, tmp_path):
+    # 2019/report/ would have been report.pdf's output directory
+    (archive / '2019' / 'report').mkdir()
+    (archive / '2019' / 'report' / 'annex.pdf').write_bytes((archive / '2019' / 'report.pdf').read_bytes())
+    output_dir = tmp_path / 'extracted'
+    run(str(archive), str(output_dir), OPTIONS)
+
+    os.utime(archive / '2019' / 'report.pdf', (0, 0))
+    assert run(str(archive), str(output_dir), OPTIONS)['done'] == 1
+    assert (output_dir / '2019' / 'report' / 'annex.pdf' / 'manifest.json').exists()
+    assert sorted(os.listdir(output_dir / '2019')) == ['report', 'report.pdf']
+
+def test_checkpoint_ignores_truncated_record(tmp_path):
+    path = tmp_path / 'checkpoint.jsonl'
+    path.write_text(json.dumps({'file': 'a.pdf', 'status': 'done'}) + '\n{"file": "b.pd')
+    checkpoint = Checkpoint(str(path))
+    checkpoint.close()
+    assert list(checkpoint.records) == ['a.pdf']
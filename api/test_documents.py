@@ -0,0 +1,29 @@
+import hashlib
+import io
+
+import documents
+from app import app
+from documents import DocumentStore
+
+def test_put_keeps_documents_within_budget(text_pdf):
+    store = DocumentStore(max_bytes=len(text_pdf))
+    document_id = store.put(text_pdf)
+    assert document_id == hashlib.sha256(text_pdf).hexdigest()
+    assert store.get_index(document_id).page_count == 3
+
+def test_put_refuses_documents_larger_than_the_store(text_pdf):
+    store = DocumentStore(max_bytes=len(text_pdf) - 1)
+    assert store.put(text_pdf) is None
+
+def test_oversized_upload_gets_413(text_pdf, monkeypatch):
+    monkeypatch.setattr(documents, '_store', DocumentStore(max_bytes=16))
+    response = app.test_client().post('/documents', data={'pdf': (io.BytesIO(text_pdf), 'text.pdf')})
+    assert response.status_code == 413
+
+def test_bad_stream_format_is_rejected_before_the_pdf_is_stored(text_pdf, monkeypatch):
+    store = DocumentStore(max_bytes=len(text_pdf))
+    monkeypatch.setattr(documents, '_store', store)
+    response = app.test_client().post('/extract-images', query_string={'preview': 'thumbnail', 'stream': 'xml'},
+                                      data={'pdf': (io.BytesIO(text_pdf), 'text.pdf')})
+    assert response.status_code == 400
+    assert store.get_index(hashlib.sha256(text_pdf).hexdigest()) is None
@@ -0,0 +1,55 @@
+import pytest
+
+from extractors import choose_render_backend, plan_extraction, scan_document
+from ingest import PdfSource
+
+def describe(img, filename):
+    return {'filename': filename, 'width': img.width, 'height': img.height}
+
+@pytest.mark.parametrize('method', ['render', 'embedded', 'auto'])
+def test_unreadable_pdf_yields_nothing_unless_strict(method):
+    source = PdfSource(b'%PDF-1.4 truncated')
+    plan = plan_extraction(source, method)
+    assert list(plan.run(source, describe)) == []
+
+    plan = plan_extraction(source, method)
+    with pytest.raises(Exception):
+        list(plan.run(source, describe, strict=True))
+
+BACKGROUND = b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+
+def scanned_pages(pdf_builder):
+    return scan_document(PdfSource(pdf_builder.build()), classify=True)['scanned_pages']
+
+def test_full_page_image_is_a_scan(pdf_builder):
+    pdf_builder.page(BACKGROUND, xobjects={'Im0': pdf_builder.jpeg()})
+    # Rotated 90 degrees, drawn without q/Q
+    pdf_builder.page(b"0 792 -612 0 612 0 cm /Im0 Do", xobjects={'Im0': pdf_builder.jpeg()})
+    assert scanned_pages(pdf_builder) == {1, 2}
+
+def test_pages_with_more_than_the_image_are_rendered(pdf_builder):
+    # Vector graphics over a background image
+    pdf_builder.page(BACKGROUND + b" 0 0 1 rg 72 72 200 100 re f", xobjects={'Im0': pdf_builder.jpeg()})
+    # Text inside a Form XObject over a background image
+    form = pdf_builder.form(b"BT /F1 24 Tf 72 700 Td (Hello) Tj ET", fonts=True)
+    pdf_builder.page(BACKGROUND + b" /Fm0 Do", xobjects={'Im0': pdf_builder.jpeg(), 'Fm0': form})
+    # Background image and text layer
+    pdf_builder.page(BACKGROUND + b" BT /F1 24 Tf 72 700 Td (OCR) Tj ET", xobjects={'Im0': pdf_builder.jpeg()},
+                     fonts=True)
+    # Small image
+    pdf_builder.page(b"q 100 0 0 100 0 0 cm /Im0 Do Q", xobjects={'Im0': pdf_builder.jpeg()})
+    # Image drawn twice
+    pdf_builder.page(BACKGROUND + b" " + BACKGROUND, xobjects={'Im0': pdf_builder.jpeg()})
+    assert scanned_pages(pdf_builder) == set()
+
+def test_auto_renders_background_pages_with_vector_content(pdf_builder):
+    pdf_builder.page(BACKGROUND, xobjects={'Im0': pdf_builder.jpeg()})
+    pdf_builder.page(BACKGROUND + b" 0 0 1 rg 72 72 200 100 re f", xobjects={'Im0': pdf_builder.jpeg()})
+    source = PdfSource(pdf_builder.build())
+    plan = plan_extraction(source, 'auto')
+
+    assert plan.scan['scanned_pages'] == {1}
+    steps = {backend.name: pages for backend, pages in plan.steps}
+    assert steps.get('embedded') == [(1, 1)]
+    if choose_render_backend() is not None:
+        assert len(steps) == 2 and [(2, 2)] in steps.values()
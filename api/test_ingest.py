@@ -0,0 +1,34 @@
+import io
+import mmap
+import tempfile
+
+from ingest import PdfSource
+
+PDF = b'%PDF-1.4\n' + b'0' * 4096
+
+def spooled(data, max_size):
+    stream = tempfile.SpooledTemporaryFile(max_size=max_size, mode='rb+')
+    stream.write(data)
+    stream.seek(0)
+    return stream
+
+def test_rolled_over_spool_is_mapped():
+    stream = spooled(PDF, max_size=1024)
+    assert stream.name is not None
+    source = PdfSource.from_upload(stream)
+    assert isinstance(source.data, mmap.mmap)
+    assert source.data[:] == PDF
+    assert source.open().read() == PDF
+    source.close()
+
+def test_in_memory_spool_is_read_without_rolling_over():
+    stream = spooled(PDF, max_size=1024 * 1024)
+    source = PdfSource.from_upload(stream)
+    assert source.data == PDF
+    assert stream.name is None
+
+def test_large_streams_are_spooled_to_a_mapped_file():
+    source = PdfSource.from_upload(io.BytesIO(PDF), spool_bytes=1024)
+    assert isinstance(source.data, mmap.mmap)
+    assert source.sha256() == PdfSource(PDF).sha256()
+    source.close()
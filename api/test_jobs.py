@@ -0,0 +1,87 @@
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jobs import JobManager, JobQueueFull, MemoryJobStore, SQLiteJobStore, count_pages, process_owner
+
+def wait_for(manager, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def per_page(source):
+    for page in (2, 3):
+        yield {'filename': f"page_{page}.png", 'page': page}
+
+def test_count_pages_honours_page_selection(text_pdf):
+    assert count_pages(text_pdf) == 3
+    assert count_pages(text_pdf, [(2, None)]) == 2
+    assert count_pages(b'not a pdf') is None
+
+def test_job_reports_selected_pages(text_pdf):
+    manager = JobManager(MemoryJobStore(), workers=1)
+    job = wait_for(manager, manager.submit(text_pdf, per_page, pages=[(2, 3)]))
+    assert job['status'] == 'done'
+    assert (job['pages_done'], job['pages_total'], job['total_images']) == (2, 2, 2)
+
+def test_extraction_error_fails_job(text_pdf):
+    def broken(source):
+        yield {'filename': 'page_1.png', 'page': 1}
+        raise RuntimeError('EOF marker not found')
+
+    manager = JobManager(MemoryJobStore(), workers=1)
+    job = wait_for(manager, manager.submit(text_pdf, broken))
+    assert job['status'] == 'failed'
+    assert job['error'] == 'EOF marker not found'
+
+def test_queue_is_bounded(text_pdf):
+    release = threading.Event()
+
+    def blocked(source):
+        release.wait(10)
+        return iter([])
+
+    manager = JobManager(MemoryJobStore(), workers=1, queue_size=2)
+    job_ids = [manager.submit(text_pdf, blocked), manager.submit(text_pdf, blocked)]
+    with pytest.raises(JobQueueFull):
+        manager.submit(text_pdf, blocked)
+    release.set()
+    for job_id in job_ids:
+        wait_for(manager, job_id)
+    # Finished jobs free their place in the queue
+    wait_for(manager, manager.submit(text_pdf, blocked))
+
+def test_store_error_frees_the_jobs_place_in_the_queue(text_pdf):
+    class LockedStore(MemoryJobStore):
+        def update(self, job_id, **fields):
+            if fields.get('status') == 'running':
+                raise RuntimeError('database is locked')
+            super().update(job_id, **fields)
+
+    manager = JobManager(LockedStore(), workers=1, queue_size=1)
+    job = wait_for(manager, manager.submit(text_pdf, per_page))
+    assert (job['status'], job['error']) == ('failed', 'database is locked')
+    wait_for(manager, manager.submit(text_pdf, per_page))
+
+def test_orphaned_sqlite_jobs_fail_on_startup(tmp_path):
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    store = SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    now = time.time()
+    for job_id, owner in (('orphan', f"{socket.gethostname()}:{exited.pid}"), ('live', process_owner())):
+        store.create({'id': job_id, 'status': 'running', 'pages_done': 0, 'pages_total': 3,
+                      'total_images': 0, 'error': None, 'created_at': now, 'updated_at': now,
+                      'images': None, 'owner': owner})
+
+    JobManager(store, workers=1)
+    assert store.get('orphan')['status'] == 'failed'
+    assert store.get('live')['status'] == 'running'
+    assert 'owner' not in store.get('live')
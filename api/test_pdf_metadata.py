@@ -0,0 +1,50 @@
+import zlib
+
+from embedded import iter_embedded_images, select_images
+from pdf_metadata import iter_pdf_metadata
+
+def flate_image(pdf_builder, width=8, height=8):
+    return pdf_builder.stream(f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                              "/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode",
+                              zlib.compress(bytes(width * height)))
+
+def describe(img, filename):
+    return {'filename': filename, 'format': 'PNG'}
+
+def test_metadata_describes_images_as_embedded_extraction_returns_them(pdf_builder):
+    form = pdf_builder.form(b"q 100 0 0 100 300 300 cm /Im1 Do Q", xobjects={'Im1': flate_image(pdf_builder)})
+    pdf_builder.page(b"q 612 0 0 792 0 0 cm /Im0 Do Q /Fm0 Do",
+                     xobjects={'Im0': pdf_builder.jpeg(), 'Fm0': form})
+    pdf = pdf_builder.build()
+
+    images = [image for image in iter_pdf_metadata(pdf) if image['source'] == 'xobject']
+    assert [(image['filename'], image['format']) for image in images] == [
+        ('embedded_image_1_Im0.jpg', 'JPEG'),
+        ('embedded_image_1_Fm0_Im1.png', 'PNG'),
+    ]
+    # The nested image is found in the form's resources and placed through it
+    assert images[1]['placements'][0]['width_pt'] == 100
+
+    embedded = list(iter_embedded_images(pdf, describe))
+    assert [image['filename'] for image in embedded] == [image['filename'] for image in images]
+    assert [image['format'] for image in embedded] == [image['format'] for image in images]
+
+def test_selected_reference_is_replaced_by_its_original(pdf_builder):
+    logo = pdf_builder.jpeg()
+    for _ in range(3):
+        pdf_builder.page(b"q 100 0 0 100 0 0 cm /Im0 Do Q", xobjects={'Im0': logo})
+    pdf = pdf_builder.build()
+
+    images = list(select_images(iter_embedded_images(pdf, describe), [(1, 2)]))
+    assert [image.get('duplicate_of') for image in images] == [None, 'embedded_image_1_Im0.jpg']
+    assert images[0]['filename'] == 'embedded_image_1_Im0.jpg' and images[0]['base64']
+    assert images[0]['pages'] == [1, 2, 3]
+
+def test_flate_images_are_returned_as_stored_without_convert(pdf_builder):
+    pdf_builder.page(b"q 100 0 0 100 0 0 cm /Im0 Do Q", xobjects={'Im0': flate_image(pdf_builder)})
+    pdf = pdf_builder.build()
+
+    image, = iter_embedded_images(pdf, describe, convert=False, encoding='raw')
+    assert image['filename'] == 'embedded_image_1_Im0.bin'
+    assert (image['format'], image['filters'], image['mode']) == ('Raw', ['FlateDecode'], 'L')
+    assert zlib.decompress(image['data']) == bytes(64)
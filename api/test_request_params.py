@@ -0,0 +1,28 @@
+import pytest
+
+from request_params import expand_ranges, parse_ranges, select_indices
+
+def test_parse_ranges():
+    assert parse_ranges('1-3,7,10-') == [(1, 3), (7, 7), (10, None)]
+    assert parse_ranges(' 2 , 4-4 ,') == [(2, 2), (4, 4)]
+
+@pytest.mark.parametrize('text', ['', ',', 'a', '3-1', '-2', '1-x', '1--3'])
+def test_parse_ranges_rejects_malformed_selections(text):
+    with pytest.raises(ValueError):
+        parse_ranges(text)
+
+def test_expand_ranges_clamps_to_document():
+    assert expand_ranges([(0, 2), (4, None), (2, 3)], 1, 5) == [1, 2, 3, 4, 5]
+    assert expand_ranges([(7, 9)], 1, 5) == []
+
+def test_select_indices_stops_after_last_selected_item():
+    consumed = []
+
+    def items():
+        for index in range(10):
+            consumed.append(index)
+            yield index
+
+    assert list(select_indices(items(), [(1, 2), (4, 4)])) == [1, 2, 4]
+    assert consumed == [0, 1, 2, 3, 4, 5]
+    assert list(select_indices(iter(range(5)), [(3, None)])) == [3, 4]
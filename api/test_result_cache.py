@@ -0,0 +1,34 @@
+import hashlib
+import json
+
+from result_cache import ResultCache, digest_cache_key, make_cache_key
+
+def test_digest_key_matches_key_from_bytes(text_pdf):
+    document_id = hashlib.sha256(text_pdf).hexdigest()
+    assert digest_cache_key(document_id, method='page-render', page=2) == make_cache_key(
+        text_pdf, method='page-render', page=2)
+
+def test_key_depends_on_content_and_parameters(text_pdf):
+    key = make_cache_key(text_pdf, method='render', dpi=200, pages=None)
+    # Parameter order does not matter
+    assert make_cache_key(text_pdf, pages=None, dpi=200, method='render') == key
+    assert make_cache_key(text_pdf, method='render', dpi=150, pages=None) != key
+    assert make_cache_key(text_pdf + b'\n', method='render', dpi=200, pages=None) != key
+
+def test_memory_tier_evicts_least_recently_used():
+    images = [{'filename': 'page_1.png', 'base64': 'x' * 100}]
+    size = len(json.dumps(images))
+    cache = ResultCache(max_bytes=2 * size)
+    cache.put('a', images)
+    cache.put('b', images)
+    assert cache.get('a') == images
+    cache.put('c', images)
+    assert cache.get('b') is None
+    assert cache.get('a') == images and cache.get('c') == images
+
+def test_disk_tier_survives_restart(tmp_path):
+    images = [{'filename': 'page_1.png', 'base64': 'x'}]
+    ResultCache(max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024).put('a', images)
+    cache = ResultCache(max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024)
+    assert cache.get('a') == images
+    assert cache.stats()['disk_hits'] == 1
@@ -0,0 +1,30 @@
+import io
+import json
+
+import server
+from server import create_app
+
+def test_dependency_checks_name_the_missing_library(text_pdf, monkeypatch):
+    monkeypatch.setattr(server, 'PIL_AVAILABLE', False)
+    upload = {'pdf': (io.BytesIO(text_pdf), 'text.pdf')}
+
+    response = create_app(check_dependencies=True).test_client().post('/extract-images', data=upload)
+    assert response.status_code == 500
+    assert 'Pillow' in response.get_json()['error']
+
+    health = create_app(dpi=150, check_dependencies=True).test_client().get('/health').get_json()
+    assert health['dependencies']['PIL'] is False
+    assert 'dependencies' not in create_app().test_client().get('/health').get_json()
+
+def test_stream_summary_lists_every_page_of_shared_images(pdf_builder):
+    logo = pdf_builder.jpeg()
+    for _ in range(3):
+        pdf_builder.page(b"q 100 0 0 100 0 0 cm /Im0 Do Q", xobjects={'Im0': logo})
+    upload = {'pdf': (io.BytesIO(pdf_builder.build()), 'logo.pdf')}
+
+    response = create_app().test_client().post('/extract-images', query_string={'method': 'embedded',
+                                                                                'stream': 'ndjson'}, data=upload)
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    # The first record was sent before the later pages were read
+    assert records[0]['image']['pages'] == [1]
+    assert records[-1]['pages'] == {'embedded_image_1_Im0.jpg': [1, 2, 3]}